@@ -1,25 +1,116 @@
 #from agent import Agent2048
 import copy 
 import random
+
+from . import board as boards
+from .engine import ReferenceEngine, get_engine
+from .ttable import board_key
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, evaluate_grids falls back to evaluate_grid
+    numpy = None
+
+# Rules used by the list-based helpers (move_left...); the search uses self.engine
+_reference = ReferenceEngine()
+
+
+def _line_terms(line):
+    """
+    Heuristic terms of one row or column of tile exponents, as evaluate_grid computes them:
+    (tile sum, monotonicity, smoothness, merge score)
+    """
+    values = [1 << exponent if exponent else 0 for exponent in line]
+    increasing = decreasing = smoothness = merge = 0
+    for first, second in zip(values, values[1:]):
+        if first <= second:
+            increasing += 1
+        if first >= second:
+            decreasing += 1
+        if first and second:
+            smoothness -= abs(first - second)
+        if first > 0 and first == second:
+            merge += first
+    return sum(values), max(increasing, decreasing), smoothness, merge
+
+
+# Row or column (exponent bytes) -> _line_terms, shared by every agent and board size
+_LINE_TERMS = boards.RowTable(_line_terms)
+
+
+class SearchCancelled(Exception):
+    """Raised inside the search when the caller asked it to stop"""
+
+
+def default_search_depth(grid_size):
+    """Expectimax depth used for a board size (bigger boards have many more chance nodes)"""
+    return 3 if grid_size <= 5 else 2
+
+
 class HeuristicAgent():
     """Agent that uses heuristics to evaluate board states"""
+
+    # Weighting for the heuristics
+    weights = {
+        'empty': 17.9,
+        'score':14.8,
+        'monotonicity': 7.9,
+        'smoothness': 4.9,
+        'corner': 16.9,
+        'closeness':17.3,
+        'merge':14.8
+    }
+    # Smallest batch evaluate_grids hands to NumPy (array setup costs more than a few boards)
+    array_batch_size = 16
+    # Biggest tile evaluate_grids hands to NumPy (the int64 sums cannot overflow)
+    array_max_tile = 1 << 48
     
-    def __init__(self, grid_size=4):
+    def __init__(self, grid_size=4, transposition_table=None, verbose=True, search_depth=None, engine=None):
         self.grid_size = grid_size
+        # Board representation used by the search: an Engine, an engine name or None for the default
+        if engine is None or isinstance(engine, str):
+            engine = get_engine(engine, grid_size)
+        self.engine = engine
+        self.verbose = verbose  # Print the score of every move while deciding
+        # Plies searched below each root move
+        self.search_depth = search_depth if search_depth is not None else default_search_depth(grid_size)
+        # Heuristic score of every board evaluated so far (cleared when it grows too big)
+        self.evaluation_cache = {}
+        self.evaluation_cache_size = 1 << 18
         self.moves = ["up", "down", "left", "right"]
+        # Optional cache of searched positions, e.g. a SharedTranspositionTable that several
+        # worker processes attach to
+        self.transposition_table = transposition_table
+        # Event checked during the search so another thread can abort it
+        self.stop_event = None
+        # Expectimax score of every valid move of the last decision (move -> score)
+        self.last_move_scores = {}
+        # Corner term of a tile, per cell and exponent (value / (distance to the corner + 1))
+        corner = self.grid_size - 1
+        self._corner_terms = [
+            [(1 << exponent) / (abs(x - corner) + abs(y - corner) + 1) if exponent else 0
+             for exponent in range(256)]
+            for y in range(self.grid_size) for x in range(self.grid_size)
+        ]
+        # (cell, cell) index pairs of neighbouring cells, in both orders
+        cells = self.grid_size * self.grid_size
+        self._adjacent_cells = {
+            (a, b) for a in range(cells) for b in range(cells)
+            if abs(a % self.grid_size - b % self.grid_size) + abs(a // self.grid_size - b // self.grid_size) == 1
+        }
     
     def print_board_state(self, grid):
         """Print the current board state in a readable format"""
         print("Current Board State:")
         print(f"DEBUG: self.grid_size = {self.grid_size} (Type: {type(self.grid_size)})")
-        print("-" * (self.grid_size * 6))
+        print("-" * (self.grid_size * 8))
         for row in grid:
             row_str = "|"
             for cell in row:
-                # Format each cell to have width 5
-                row_str += f" {cell:4d} |"
+                # Format each cell to have width 6 (fits 5-digit tiles of bigger boards)
+                row_str += f" {cell:5d} |"
             print(row_str)
-            print("-" * (self.grid_size * 6))
+            print("-" * (self.grid_size * 8))
         
         # Print some basic statistics about the board
         flat_grid = [cell for row in grid for cell in row]
@@ -85,16 +176,7 @@ class HeuristicAgent():
         closeness =self._highest_tiles_closeness(grid)
         merge = self._merge_opportunities(grid)
         
-        # Weighting for the heuristics
-        weights = {
-            'empty': 17.9,
-            'score':14.8,
-            'monotonicity': 7.9,
-            'smoothness': 4.9,
-            'corner': 16.9,
-            'closeness':17.3,
-            'merge':14.8
-        }
+        weights = self.weights
 
         # Calculate final score
         final_score = (
@@ -111,6 +193,70 @@ class HeuristicAgent():
 
         
         return final_score
+
+    def evaluate_grids(self, grids):
+        """
+        Evaluate several boards in one call (used to batch requests), returns a list of scores.
+        With NumPy installed, big enough batches are evaluated with array operations over the
+        whole batch; the scores are the same as evaluate_grid's, bit for bit.
+        """
+        if numpy is not None and len(grids) >= self.array_batch_size:
+            try:
+                values = numpy.array(grids, dtype=numpy.int64)
+            except (OverflowError, ValueError, TypeError):
+                values = None  # Huge tiles or ragged grids: evaluate one by one
+            size = self.grid_size
+            if (values is not None and values.shape == (len(grids), size, size)
+                    and numpy.abs(values).max() <= self.array_max_tile):
+                return self._evaluate_array(values).tolist()
+        return [self.evaluate_grid(grid) for grid in grids]
+
+    def _evaluate_array(self, grids):
+        """evaluate_grid for an (n, size, size) int64 array of tile values, every board at once"""
+        size = self.grid_size
+        flat = grids.reshape(len(grids), size * size)
+
+        empty_count = (flat == 0).sum(axis=1)
+        score = flat.sum(axis=1)
+
+        # Monotonicity, smoothness and merges look at neighbours along rows, then along columns
+        monotonicity = smoothness = merge = 0
+        for lines in (grids, grids.transpose(0, 2, 1)):
+            first, second = lines[:, :, :-1], lines[:, :, 1:]
+            increasing = (first <= second).sum(axis=2)
+            decreasing = (first >= second).sum(axis=2)
+            monotonicity = monotonicity + numpy.maximum(increasing, decreasing).sum(axis=1)
+            both_tiles = (first != 0) & (second != 0)
+            smoothness = smoothness - numpy.where(both_tiles, numpy.abs(first - second), 0).sum(axis=(1, 2))
+            merge = merge + numpy.where((first > 0) & (first == second), first, 0).sum(axis=(1, 2))
+
+        # Preferred corner: cumsum adds the cells in the same order as the loop in evaluate_grid
+        corner_y = corner_x = size - 1
+        y, x = numpy.divmod(numpy.arange(size * size), size)
+        distance = numpy.abs(x - corner_x) + numpy.abs(y - corner_y)
+        corner = numpy.cumsum(numpy.where(flat > 0, flat / (distance + 1), 0.0), axis=1)[:, -1]
+        max_in_corner = grids[:, corner_y, corner_x] == flat.max(axis=1)
+        corner_bonus = numpy.where(max_in_corner, corner * 1.5, corner)
+
+        # Closeness: adjacent pairs among the 3 highest tiles (stable sort, like evaluate_grid)
+        top = numpy.argsort(-flat, axis=1, kind="stable")[:, :3]
+        top_values = numpy.take_along_axis(flat, top, axis=1)
+        top_y, top_x = numpy.divmod(top, size)
+        closeness = 0
+        for i, j in ((0, 1), (0, 2), (1, 2)):
+            adjacent = numpy.abs(top_x[:, i] - top_x[:, j]) + numpy.abs(top_y[:, i] - top_y[:, j]) == 1
+            closeness = closeness + (adjacent & (top_values[:, i] != 0) & (top_values[:, j] != 0))
+
+        weights = self.weights
+        return (
+            weights['empty'] * empty_count +
+            weights['score'] * score +
+            weights['monotonicity'] * monotonicity +
+            weights['smoothness'] * smoothness +
+            weights['corner'] * corner_bonus +
+            weights['closeness'] * closeness +
+            weights['merge'] * merge
+        )
     
     def _calculate_monotonicity(self, grid):
         """Calculate how monotonic the grid is (values increasing or decreasing)"""
@@ -204,10 +350,12 @@ class HeuristicAgent():
         
         return closeness_score
     
-    def _highest_tile_in_preferred_corner(self, grid, preferred_corner=(3, 3)):
+    def _highest_tile_in_preferred_corner(self, grid, preferred_corner=None):
         """Encourage the highest tiles to stay in one preferred corner (default: bottom-right)"""
         
         # Unpack the preferred corner position
+        if preferred_corner is None:
+            preferred_corner = (self.grid_size - 1, self.grid_size - 1)
         corner_x, corner_y = preferred_corner
     
         # Find the maximum tile value
@@ -247,32 +395,40 @@ class HeuristicAgent():
          
          return merge_score
      
-    def make_decision(self, grid):
-        """"Make a simple decision - always move right if possible, otherwise random"""
-        valid_moves = self.get_valid_moves(grid)
+    def make_decision(self, grid, stop_event=None):
+        """
+        Pick the move with the best expectimax score.
+        If stop_event (a threading.Event) gets set while searching, the search is
+        abandoned and None is returned.
+        """
+        self.stop_event = stop_event
+        self.last_move_scores = {}
+        try:
+            return self._make_decision(grid)
+        except SearchCancelled:
+            return None
+        finally:
+            self.stop_event = None
+
+    def _make_decision(self, grid):
+        """Search every valid move and return the best one"""
+        board = self.engine.encode(grid)
+        children = self.engine.children(board)
 
-        if not valid_moves:
+        if not children:
             return None  #no valid movements
 
         best_move = None
         best_score = float('-inf')
 
-        for move in valid_moves:
-            test_grid = copy.deepcopy(grid)  # Clone board to test movement
-
-            if move == "left":
-                new_grid = self.move_left(test_grid)
-            elif move == "right":
-                new_grid = self.move_right(test_grid)
-            elif move == "up":
-                new_grid = self.move_up(test_grid)
-            elif move == "down":
-                new_grid = self.move_down(test_grid)
-
-            score = self.evaluate_grid(new_grid)  # Evaluate the board after the move
-            print(f"Movement: {move}, Score Evaluated: {score}")
-            score = self.expectimax(new_grid, depth=3, player_turn=False)  # Call Expectimax with depth 3
-            print(f"Movement: {move}, Score expected: {score}")
+        for move, new_board in children:
+            if self.verbose:
+                score = self._evaluate_board(new_board)  # Evaluate the board after the move
+                print(f"Movement: {move}, Score Evaluated: {score}")
+            score = self._search(new_board, self.search_depth, False)  # Call Expectimax
+            if self.verbose:
+                print(f"Movement: {move}, Score expected: {score}")
+            self.last_move_scores[move] = score
 
             if score > best_score:
                 best_score = score
@@ -283,97 +439,153 @@ class HeuristicAgent():
     # Move functions
     def move_left(self, grid):
         """Move all tiles to the left and merge tiles with the same value"""
-        new_grid = [row[:] for row in grid]
-        
-        for y in range(self.grid_size):
-            row = [tile for tile in new_grid[y] if tile != 0]
-            
-            merged_row = []
-            i = 0
-            while i < len(row):
-                if i < len(row) - 1 and row[i] == row[i+1]:
-                    merged_row.append(row[i] * 2)
-                    i += 2
-                else:
-                    merged_row.append(row[i])
-                    i += 1
-            
-            merged_row = merged_row + [0] * (self.grid_size - len(merged_row))
-            new_grid[y] = merged_row
-        
-        return new_grid
+        return _reference.move_left(grid)[0]
     
     def move_right(self, grid):
         """Move all tiles to the right and merge tiles with the same value"""
-        new_grid = [row[:] for row in grid]
-        
-        for y in range(self.grid_size):
-            row = [tile for tile in new_grid[y] if tile != 0]
-            
-            merged_row = []
-            i = len(row) - 1
-            while i >= 0:
-                if i > 0 and row[i] == row[i-1]:
-                    merged_row.insert(0, row[i] * 2)
-                    i -= 2
-                else:
-                    merged_row.insert(0, row[i])
-                    i -= 1
-            
-            merged_row = [0] * (self.grid_size - len(merged_row)) + merged_row
-            new_grid[y] = merged_row
-        
-        return new_grid
+        return _reference.move_right(grid)[0]
     
     def move_up(self, grid):
         """Move all tiles up and merge tiles with the same value"""
-        transposed = list(map(list, zip(*grid)))
-        moved = self.move_left(transposed)
-        return list(map(list, zip(*moved)))
+        return _reference.move_up(grid)[0]
     
     def move_down(self, grid):
         """Move all tiles down and merge tiles with the same value"""
-        transposed = list(map(list, zip(*grid)))
-        moved = self.move_right(transposed)
-        return list(map(list, zip(*moved)))
+        return _reference.move_down(grid)[0]
     
+    def _evaluate_board(self, board):
+        """evaluate_grid for a compact board, remembering the result"""
+        cache = self.evaluation_cache
+        key = self.engine.key(board)
+        score = cache.get(key)
+        if score is None:
+            if len(cache) >= self.evaluation_cache_size:
+                cache.clear()
+            score = cache[key] = self._evaluate_exponents(self.engine.exponents(board))
+        return score
+
+    def _evaluate_exponents(self, cells):
+        """
+        evaluate_grid for a board given as row-major tile exponents (bytes), with the same result.
+        Every term has its own small method so the components profiler can time it.
+        """
+        score, monotonicity, smoothness, merge = self._line_terms_exponents(cells)
+        weights = self.weights
+        return (
+            weights['empty'] * self._empty_exponents(cells) +
+            weights['score'] * score +
+            weights['monotonicity'] * monotonicity +
+            weights['smoothness'] * smoothness +
+            weights['corner'] * self._corner_exponents(cells) +
+            weights['closeness'] * self._closeness_exponents(cells) +
+            weights['merge'] * merge
+        )
+
+    def _line_terms_exponents(self, cells):
+        """
+        Tile sum, monotonicity, smoothness and merge score for exponent bytes: every row and
+        column is one lookup in the table of line terms
+        """
+        size = self.grid_size
+        terms = _LINE_TERMS
+        score = monotonicity = smoothness = merge = 0
+        for start in range(0, len(cells), size):
+            tile_sum, line_monotonicity, line_smoothness, line_merge = terms[cells[start:start + size]]
+            score += tile_sum
+            monotonicity += line_monotonicity
+            smoothness += line_smoothness
+            merge += line_merge
+        for column in range(size):
+            _, line_monotonicity, line_smoothness, line_merge = terms[cells[column::size]]
+            monotonicity += line_monotonicity
+            smoothness += line_smoothness
+            merge += line_merge
+        return score, monotonicity, smoothness, merge
+
+    def _empty_exponents(self, cells):
+        """Number of empty cells for exponent bytes"""
+        return cells.count(0)
+
+    def _corner_exponents(self, cells):
+        """_highest_tile_in_preferred_corner (bottom-right) for exponent bytes"""
+        # Same additions in the same order, so the float result is identical
+        closeness_score = 0
+        for cell_terms, exponent in zip(self._corner_terms, cells):
+            if exponent:
+                closeness_score += cell_terms[exponent]
+        if cells[-1] == max(cells):
+            closeness_score *= 1.5
+        return closeness_score
+
+    def _closeness_exponents(self, cells):
+        """_highest_tiles_closeness for exponent bytes"""
+        tiles = [index for index, exponent in enumerate(cells) if exponent]
+        if len(tiles) < 2:
+            return 0
+        # Stable sort: equal tiles keep their row-major order, like in _highest_tiles_closeness
+        top_tiles = sorted(tiles, key=cells.__getitem__, reverse=True)[:3]
+
+        adjacent_cells = self._adjacent_cells
+        closeness_score = 0
+        for i in range(len(top_tiles)):
+            for j in range(i + 1, len(top_tiles)):
+                if (top_tiles[i], top_tiles[j]) in adjacent_cells:
+                    closeness_score += 1
+        return closeness_score
+
     def expectimax(self, grid, depth, player_turn):
-        """Implements Expectimax Algorithm """
-        if depth == 0 or not self.get_valid_moves(grid):
-            return self.evaluate_grid(
-                grid)  # Evaluate the board if it reaches the depth limit or there are no more moves
+        """Implements Expectimax Algorithm"""
+        return self._search(self.engine.encode(grid), depth, player_turn)
 
-        if player_turn:  # MAX - IA's turn
-            best_score = float('-inf')
-            for move in self.get_valid_moves(grid):
-                test_grid = copy.deepcopy(grid)
+    def _search(self, board, depth, player_turn):
+        """Expectimax on a compact board, consulting the transposition table if there is one"""
+        table = self.transposition_table
+        if table is None or depth == 0:
+            return self._expectimax(board, depth, player_turn)
 
-                if move == "left":
-                    new_grid = self.move_left(test_grid)
-                elif move == "right":
-                    new_grid = self.move_right(test_grid)
-                elif move == "up":
-                    new_grid = self.move_up(test_grid)
-                elif move == "down":
-                    new_grid = self.move_down(test_grid)
+        key = board_key(self.engine.exponents(board))
+        score = table.probe(key, depth, player_turn)
+        if score is None:
+            score = self._expectimax(board, depth, player_turn)
+            table.store(key, depth, score, player_turn)
+        return score
 
-                score = self.expectimax(new_grid, depth - 1, False)  # game's turn
-                best_score = max(best_score, score)
+    def _expectimax(self, board, depth, player_turn):
+        """Expectimax search of a single node (children go through _search)"""
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchCancelled()
 
-            return best_score  # Devuelve la mejor puntuación posible para la IA
+        if depth == 0:
+            return self._evaluate_board(board)  # Evaluate the board if it reaches the depth limit
 
+        if player_turn:  # MAX - IA's turn
+            return self._max_node(board, depth)
         else:  # "Games" turn's  (new tile placed)
-            empty_cells = self.get_empty_cells(grid)
-            if not empty_cells:
-                return self.evaluate_grid(grid)  # If there are no empty spaces, evaluate directly
+            return self._chance_node(board, depth)
+
+    def _max_node(self, board, depth):
+        """Best score over the agent's valid moves"""
+        children = self.engine.children(board)
+        if not children:
+            return self._evaluate_board(board)  # No more moves
+
+        best_score = float('-inf')
+        for _, new_board in children:
+            score = self._search(new_board, depth - 1, False)  # game's turn
+            best_score = max(best_score, score)
+
+        return best_score  # Devuelve la mejor puntuación posible para la IA
 
-            total_score = 0
-            for cell in empty_cells:
-                for value in [2, 4]:  # new tiles might be  2 o 4
-                    test_grid = copy.deepcopy(grid)
-                    test_grid[cell[1]][cell[0]] = value  #place new tile
+    def _chance_node(self, board, depth):
+        """Expected score over every tile the game can place next"""
+        empty_cells = self.engine.empty_cells(board)
+        if not empty_cells:
+            return self._evaluate_board(board)  # If there are no empty spaces, evaluate directly
 
-                    probability = 0.9 if value == 2 else 0.1  # 90% chances being a  2, 10% - 4
-                    total_score += probability * self.expectimax(test_grid, depth - 1, True)  #  back IA turn
+        total_score = 0
+        for cell in empty_cells:
+            for exponent, probability in ((1, 0.9), (2, 0.1)):  # new tiles might be 2 (90%) o 4 (10%)
+                new_board = self.engine.place(board, cell, exponent)  #place new tile
+                total_score += probability * self._search(new_board, depth - 1, True)  #  back IA turn
 
-            return total_score / len(empty_cells)  # Averaging the scores
\ No newline at end of file
+        return total_score / len(empty_cells)  # Averaging the scores
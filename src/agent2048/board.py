@@ -0,0 +1,141 @@
+"""Compact board representation used by the search
+
+A board is a bytes object with one cell per byte, row by row, holding the tile exponent
+(0 = empty, 1 = 2, 2 = 4, 3 = 8, ...). Boards are immutable and hashable, copying one is
+a single allocation, and a row is moved with one dictionary lookup in a move table that
+is filled the first time a row is seen (and emptied when it gets too big).
+"""
+
+MOVES = ("up", "down", "left", "right")
+
+
+def encode(grid):
+    """Convert a 2D list of tile values into a board"""
+    return bytes(value.bit_length() - 1 if value else 0 for row in grid for value in row)
+
+
+def decode(board, size):
+    """Convert a board back into a 2D list of tile values"""
+    values = [1 << exponent if exponent else 0 for exponent in board]
+    return [values[start:start + size] for start in range(0, size * size, size)]
+
+
+# Text form of a board: one base-36 digit per cell exponent, rows optionally separated by "/"
+# e.g. "0000/0100/0012/1234" (the 16 can be written without the slashes)
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def to_string(board, size):
+    """Text form of a board, rows separated by '/'"""
+    text = "".join(_DIGITS[exponent] for exponent in board)
+    return "/".join(text[start:start + size] for start in range(0, size * size, size))
+
+
+def from_string(text):
+    """Parse the text form of a board; returns (board, size)"""
+    cells = text.replace("/", "").strip().lower()
+    size = int(round(len(cells) ** 0.5))
+    if size < 2 or size * size != len(cells):
+        raise ValueError(f"{text!r} does not describe a square board")
+    try:
+        board = bytes(_DIGITS.index(digit) for digit in cells)
+    except ValueError:
+        raise ValueError(f"{text!r} contains a character that is not a base-36 digit") from None
+    return board, size
+
+
+def slide_row(row):
+    """Move one row (sequence of exponents) to the left, returns (new row, score gained)"""
+    tiles = [exponent for exponent in row if exponent]
+    merged = []
+    reward = 0
+    i = 0
+    while i < len(tiles):
+        if i < len(tiles) - 1 and tiles[i] == tiles[i + 1]:
+            merged.append(tiles[i] + 1)
+            reward += 1 << (tiles[i] + 1)
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+    merged += [0] * (len(row) - len(merged))
+    return bytes(merged), reward
+
+
+# Entries a row table keeps before it starts over (rows seen again are recomputed)
+ROW_TABLE_SIZE = 1 << 16
+
+
+class RowTable(dict):
+    """Row -> function(row) table, filled lazily and emptied when it reaches max_entries"""
+
+    def __init__(self, function, max_entries=ROW_TABLE_SIZE):
+        super().__init__()
+        self.function = function
+        self.max_entries = max_entries
+
+    def __missing__(self, row):
+        if len(self) >= self.max_entries:
+            self.clear()  # Bounded like the agent's evaluation cache
+        entry = self[row] = self.function(row)
+        return entry
+
+
+def _slide_row_right(row):
+    moved, reward = slide_row(row[::-1])
+    return moved[::-1], reward
+
+
+# Row -> (moved row, reward), shared by every board size (rows of different widths never collide)
+_LEFT = RowTable(slide_row)
+_RIGHT = RowTable(_slide_row_right)
+
+
+def transpose(board, size):
+    """Swap rows and columns"""
+    return b"".join([board[column::size] for column in range(size)])
+
+
+def _move_rows(board, size, table):
+    rows = [table[board[start:start + size]] for start in range(0, len(board), size)]
+    return b"".join([row for row, _ in rows]), sum([reward for _, reward in rows])
+
+
+def move(board, size, direction):
+    """
+    Apply a move to a board.
+    Returns (new board, score gained); the new board equals the old one if the move is invalid.
+    """
+    if direction == "left":
+        return _move_rows(board, size, _LEFT)
+    if direction == "right":
+        return _move_rows(board, size, _RIGHT)
+
+    # Vertical moves work on columns, which are the rows of the transposed board
+    if direction == "up":
+        moved, reward = _move_rows(transpose(board, size), size, _LEFT)
+    elif direction == "down":
+        moved, reward = _move_rows(transpose(board, size), size, _RIGHT)
+    else:
+        raise ValueError(f"Unknown move {direction!r}")
+    return transpose(moved, size), reward
+
+
+def children(board, size):
+    """Return (move, new board) for every valid move, in MOVES order"""
+    result = []
+    for direction in MOVES:
+        new_board, _ = move(board, size, direction)
+        if new_board != board:
+            result.append((direction, new_board))
+    return result
+
+
+def empty_cells(board):
+    """Return the indices of the empty cells"""
+    return [index for index, exponent in enumerate(board) if not exponent]
+
+
+def place(board, index, exponent):
+    """Return a copy of board with a tile of the given exponent at index"""
+    return board[:index] + bytes((exponent,)) + board[index + 1:]
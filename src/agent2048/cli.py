@@ -0,0 +1,131 @@
+"""Command line entry point: plays the game by default, other tools are subcommands"""
+import argparse
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="agent2048", description="2048 game with a heuristic Expectimax agent")
+    subparsers = parser.add_subparsers(dest="command")
+
+    play = subparsers.add_parser("play", help="play in a pygame window (default)")
+    play.add_argument("--size", type=int, default=4, help="board width/height (default: %(default)s)")
+
+    serve = subparsers.add_parser("serve", help="answer make_decision / evaluate_grid requests over a local socket")
+    serve.add_argument("--host", default="127.0.0.1", help="TCP address to listen on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=2048, help="TCP port to listen on (default: %(default)s)")
+    serve.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    serve.add_argument("--batch-window-ms", type=float, default=2.0,
+                       help="how long to wait for more requests before running a batch (default: %(default)s)")
+    serve.add_argument("--max-batch", type=int, default=64, help="maximum requests per batch (default: %(default)s)")
+    serve.add_argument("--deadline-ms", type=float, default=None,
+                       help="deadline for requests that do not specify deadline_ms")
+    serve.add_argument("--size", type=int, default=4, help="board width/height (default: %(default)s)")
+
+    selfplay = subparsers.add_parser("selfplay", help="record self-play games as a training dataset (.npy shards)")
+    selfplay.add_argument("--out", required=True, metavar="DIR", help="directory the shards are written to")
+    selfplay.add_argument("--games", type=int, default=100, help="number of games to play (default: %(default)s)")
+    selfplay.add_argument("--size", type=int, default=4, help="board width/height (default: %(default)s)")
+    selfplay.add_argument("--shard-size", type=int, default=1 << 16,
+                          help="maximum positions per shard (default: %(default)s)")
+    selfplay.add_argument("--depth", type=int, default=None, help="expectimax depth (default: depends on --size)")
+    selfplay.add_argument("--seed", type=int, default=None,
+                          help="random seed for reproducible datasets (only without --table-buckets)")
+    selfplay.add_argument("--workers", type=int, default=1, help="games played in parallel (default: %(default)s)")
+    selfplay.add_argument("--table-buckets", type=int, default=0,
+                          help="size of the transposition table shared by the workers (default: no table); "
+                               "results then depend on timing, even with --seed")
+
+    fuzz = subparsers.add_parser("fuzz", help="check every engine backend against the reference engine")
+    fuzz.add_argument("--positions", type=int, default=100000, help="random positions to check (default: %(default)s)")
+    fuzz.add_argument("--sizes", type=int, nargs="+", default=[4, 5, 6], help="board sizes (default: 4 5 6)")
+    fuzz.add_argument("--engines", nargs="+", default=None, help="engines to check (default: all available)")
+    fuzz.add_argument("--seed", type=int, default=None, help="random seed to reproduce a run")
+    fuzz.add_argument("--workers", type=int, default=1, help="processes to spread the positions over (default: %(default)s)")
+
+    profile = subparsers.add_parser("profile", help="profile one decision and write collapsed stacks for flame graphs")
+    profile.add_argument("--board", required=True,
+                         help="position, one base-36 tile exponent per cell, e.g. 0000/0100/0012/1234")
+    profile.add_argument("--profiler", default="components", choices=["cprofile", "sampling", "components"],
+                         help="how to measure (default: %(default)s)")
+    profile.add_argument("--repeat", type=int, default=1, help="decisions to run (default: %(default)s)")
+    profile.add_argument("--depth", type=int, default=None, help="expectimax depth (default: depends on the board size)")
+    profile.add_argument("--engine", default=None, help="engine backend (default: $AGENT2048_ENGINE or bytes)")
+    profile.add_argument("--out", default="-", help="collapsed stacks file (default: stdout)")
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "size", 4) < 2:
+        parser.error("--size must be at least 2")
+    for option in ("games", "shard_size", "workers"):
+        if args.command == "selfplay" and getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1")
+
+    if args.command == "serve":
+        from .serve import run_server
+        run_server(
+            host=args.host,
+            port=args.port,
+            unix_path=args.unix,
+            batch_window_ms=args.batch_window_ms,
+            max_batch=args.max_batch,
+            default_deadline_ms=args.deadline_ms,
+            grid_size=args.size,
+        )
+    elif args.command == "selfplay":
+        from .selfplay import export_selfplay
+        export_selfplay(
+            args.out,
+            args.games,
+            size=args.size,
+            shard_size=args.shard_size,
+            seed=args.seed,
+            search_depth=args.depth,
+            workers=args.workers,
+            table_buckets=args.table_buckets,
+        )
+    elif args.command == "fuzz":
+        import sys
+        from .engine import ENGINES
+        from .fuzz import FuzzMismatch, run_fuzz, run_fuzz_parallel, skipped_engines
+        unknown = [name for name in args.engines or () if name not in ENGINES]
+        if unknown:
+            parser.error(f"unknown engine(s) {', '.join(unknown)}, choose from {', '.join(ENGINES)}")
+        for size in args.sizes:
+            skipped = skipped_engines(args.engines, size)
+            if skipped:
+                print(f"{size}x{size}: skipping {', '.join(skipped)} (not available for this size)", file=sys.stderr)
+        try:
+            if args.workers > 1:
+                checked = run_fuzz_parallel(args.positions, args.workers, args.sizes, args.engines, args.seed)
+            else:
+                checked = run_fuzz(args.positions, args.sizes, args.engines, args.seed)
+        except FuzzMismatch as mismatch:
+            raise SystemExit(f"MISMATCH: {mismatch}")
+        if not checked:
+            raise SystemExit("No engine was checked (the reference engine is what the others are checked against)")
+        for (size, name), count in sorted(checked.items()):
+            print(f"{size}x{size} {name}: {count} positions match the reference engine")
+    elif args.command == "profile":
+        import sys
+        if args.repeat < 1:
+            parser.error("--repeat must be at least 1")
+        from .profiling import profile_decision, write_collapsed
+        try:
+            profiler, move, seconds = profile_decision(args.board, args.profiler, args.repeat, args.depth, args.engine)
+        except (ValueError, RuntimeError) as error:
+            parser.error(str(error))
+        stacks = profiler.collapsed()
+        if args.out == "-":
+            write_collapsed(stacks, sys.stdout)
+        else:
+            with open(args.out, "w") as out:
+                write_collapsed(stacks, out)
+        print(f"Move: {move}, {seconds * 1000:.1f} ms per decision, "
+              f"{sum(stacks.values())} {profiler.unit} in {len(stacks)} stacks", file=sys.stderr)
+    else:
+        # Imported lazily: the game module opens the pygame window
+        from .game import main as play
+        play(size=getattr(args, "size", 4))
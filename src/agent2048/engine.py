@@ -0,0 +1,422 @@
+"""Game engines: one interface, several interchangeable board representations
+
+Every engine works on its own board type (produced by encode) and offers the same
+operations, so the agent can search with whichever backend is fastest while the
+reference engine stays the definition of the rules:
+
+    reference   2D lists of tile values, plain Python (used by the game and as the oracle)
+    bytes       one byte per cell exponent boards with lazily filled row tables (any size)
+    packed      4x4 boards packed into one int, 4 bits per cell, full row tables (tiles <= 16384)
+    numpy       uint8 exponent arrays, rows moved with array operations (needs NumPy)
+
+get_engine() picks a backend by name; without a name the AGENT2048_ENGINE environment
+variable is used, falling back to DEFAULT_ENGINE.
+"""
+import os
+
+from . import board as boards
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, only the numpy engine needs it
+    numpy = None
+
+MOVES = boards.MOVES
+DEFAULT_ENGINE = "bytes"
+
+
+class Engine():
+    """Interface shared by all engines (size is the board width/height)"""
+
+    name = None
+    # Biggest tile exponent encode accepts: two such tiles must still be able to merge
+    # (one byte per exponent)
+    max_exponent = 254
+
+    def __init__(self, size=4):
+        self.size = size
+
+    def __reduce__(self):
+        # Engines are rebuilt by name, their tables are per process caches
+        return (get_engine, (self.name, self.size))
+
+    def __repr__(self):
+        return f"<{type(self).__name__} size={self.size}>"
+
+    def encode(self, grid):
+        """Convert a 2D list of tile values into a board"""
+        raise NotImplementedError
+
+    def decode(self, board):
+        """Convert a board into a 2D list of tile values"""
+        raise NotImplementedError
+
+    def move(self, board, direction):
+        """Apply a move; returns (new board, score gained, whether the board changed)"""
+        raise NotImplementedError
+
+    def empty_cells(self, board):
+        """Indices (row-major) of the empty cells"""
+        raise NotImplementedError
+
+    def place(self, board, index, exponent):
+        """Return a copy of board with a tile of the given exponent at index"""
+        raise NotImplementedError
+
+    def exponents(self, board):
+        """Tile exponents as bytes, row-major (engine independent form of a board)"""
+        raise NotImplementedError
+
+    def key(self, board):
+        """Hashable value identifying a board (used for caches)"""
+        return board
+
+    def children(self, board):
+        """Return (move, new board) for every valid move, in MOVES order"""
+        result = []
+        for direction in MOVES:
+            new_board, _, changed = self.move(board, direction)
+            if changed:
+                result.append((direction, new_board))
+        return result
+
+
+# ----------------------------------------------------------------------
+# Reference engine
+# ----------------------------------------------------------------------
+
+class ReferenceEngine(Engine):
+    """Plain Python on 2D lists of tile values; the definition of how tiles move"""
+
+    name = "reference"
+
+    def encode(self, grid):
+        return [row[:] for row in grid]
+
+    def decode(self, board):
+        return [row[:] for row in board]
+
+    def move_left(self, grid):
+        """Move all tiles to the left and merge tiles with the same value; returns (grid, score gained)"""
+        new_grid = []
+        reward = 0
+
+        for row in grid:
+            # Remove empty spaces, then merge adjacent equal tiles from the left
+            tiles = [tile for tile in row if tile != 0]
+            merged_row = []
+            i = 0
+            while i < len(tiles):
+                if i < len(tiles) - 1 and tiles[i] == tiles[i + 1]:
+                    merged_row.append(tiles[i] * 2)
+                    reward += tiles[i] * 2
+                    i += 2  # Skip the next tile since we merged it
+                else:
+                    merged_row.append(tiles[i])
+                    i += 1
+
+            new_grid.append(merged_row + [0] * (len(row) - len(merged_row)))
+
+        return new_grid, reward
+
+    def move_right(self, grid):
+        """Move all tiles to the right (mirror of move_left); returns (grid, score gained)"""
+        moved, reward = self.move_left([row[::-1] for row in grid])
+        return [row[::-1] for row in moved], reward
+
+    def move_up(self, grid):
+        """Move all tiles up (move_left on the transposed grid); returns (grid, score gained)"""
+        moved, reward = self.move_left([list(column) for column in zip(*grid)])
+        return [list(row) for row in zip(*moved)], reward
+
+    def move_down(self, grid):
+        """Move all tiles down (move_right on the transposed grid); returns (grid, score gained)"""
+        moved, reward = self.move_right([list(column) for column in zip(*grid)])
+        return [list(row) for row in zip(*moved)], reward
+
+    def move(self, board, direction):
+        if direction == "left":
+            new_board, reward = self.move_left(board)
+        elif direction == "right":
+            new_board, reward = self.move_right(board)
+        elif direction == "up":
+            new_board, reward = self.move_up(board)
+        elif direction == "down":
+            new_board, reward = self.move_down(board)
+        else:
+            raise ValueError(f"Unknown move {direction!r}")
+        return new_board, reward, new_board != board
+
+    def empty_cells(self, board):
+        size = len(board)
+        return [y * size + x for y, row in enumerate(board) for x, value in enumerate(row) if value == 0]
+
+    def place(self, board, index, exponent):
+        size = len(board)
+        new_board = [row[:] for row in board]
+        new_board[index // size][index % size] = 1 << exponent
+        return new_board
+
+    def exponents(self, board):
+        return bytes(value.bit_length() - 1 if value else 0 for row in board for value in row)
+
+    def key(self, board):
+        return tuple(tuple(row) for row in board)
+
+
+# ----------------------------------------------------------------------
+# Byte-per-cell engine
+# ----------------------------------------------------------------------
+
+class BytesEngine(Engine):
+    """Exponent bytes with per-width row tables (see board.py), works for any board size"""
+
+    name = "bytes"
+
+    def encode(self, grid):
+        board = boards.encode(grid)
+        if max(board) > self.max_exponent:
+            raise ValueError(f"The bytes engine only supports tiles up to 2**{self.max_exponent}")
+        return board
+
+    def decode(self, board):
+        return boards.decode(board, self.size)
+
+    def move(self, board, direction):
+        new_board, reward = boards.move(board, self.size, direction)
+        return new_board, reward, new_board != board
+
+    def children(self, board):
+        return boards.children(board, self.size)
+
+    def empty_cells(self, board):
+        return boards.empty_cells(board)
+
+    def place(self, board, index, exponent):
+        return boards.place(board, index, exponent)
+
+    def exponents(self, board):
+        return board
+
+
+# ----------------------------------------------------------------------
+# Packed int engine (4x4)
+# ----------------------------------------------------------------------
+
+# Row -> moved row and row -> score gained, indexed by the 16-bit row value.
+# A row whose merge would need a 65536 tile maps to None.
+_packed_tables = None
+
+
+def _build_packed_tables():
+    global _packed_tables
+    if _packed_tables is None:
+        left, right, left_reward, right_reward = [], [], [], []
+        for row in range(1 << 16):
+            cells = bytes((row >> shift) & 0xF for shift in (0, 4, 8, 12))
+            for table, rewards, reverse in ((left, left_reward, False), (right, right_reward, True)):
+                moved, reward = boards.slide_row(cells[::-1] if reverse else cells)
+                if reverse:
+                    moved = moved[::-1]
+                if max(moved) > 15:
+                    table.append(None)
+                else:
+                    table.append(moved[0] | moved[1] << 4 | moved[2] << 8 | moved[3] << 12)
+                rewards.append(reward)
+        _packed_tables = (left, right, left_reward, right_reward)
+    return _packed_tables
+
+
+def _transpose_packed(board):
+    """Transpose a 4x4 board of nibbles (cell (y, x) lives at bits 16 * y + 4 * x)"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+class PackedEngine(Engine):
+    """4x4 boards as one int (4 bits per cell); a row moves with one table lookup"""
+
+    name = "packed"
+    max_exponent = 14  # Merging two 16384s gives 32768, the biggest tile a nibble holds
+
+    def __init__(self, size=4):
+        if size != 4:
+            raise ValueError("The packed engine only supports 4x4 boards")
+        super().__init__(size)
+        self.left, self.right, self.left_reward, self.right_reward = _build_packed_tables()
+
+    def encode(self, grid):
+        board = 0
+        for index, exponent in enumerate(boards.encode(grid)):
+            if exponent > self.max_exponent:
+                raise ValueError("The packed engine only supports tiles up to 16384")
+            board |= exponent << (4 * index)
+        return board
+
+    def decode(self, board):
+        return boards.decode(self.exponents(board), 4)
+
+    def _move_rows(self, board, table, rewards):
+        row0 = board & 0xFFFF
+        row1 = (board >> 16) & 0xFFFF
+        row2 = (board >> 32) & 0xFFFF
+        row3 = board >> 48
+        try:
+            new_board = table[row0] | table[row1] << 16 | table[row2] << 32 | table[row3] << 48
+        except TypeError:  # A None entry: the merge does not fit in 4 bits
+            raise OverflowError("The packed engine only supports tiles up to 32768") from None
+        return new_board, rewards[row0] + rewards[row1] + rewards[row2] + rewards[row3]
+
+    def move(self, board, direction):
+        if direction == "left":
+            new_board, reward = self._move_rows(board, self.left, self.left_reward)
+        elif direction == "right":
+            new_board, reward = self._move_rows(board, self.right, self.right_reward)
+        elif direction == "up":
+            new_board, reward = self._move_rows(_transpose_packed(board), self.left, self.left_reward)
+            new_board = _transpose_packed(new_board)
+        elif direction == "down":
+            new_board, reward = self._move_rows(_transpose_packed(board), self.right, self.right_reward)
+            new_board = _transpose_packed(new_board)
+        else:
+            raise ValueError(f"Unknown move {direction!r}")
+        return new_board, reward, new_board != board
+
+    def empty_cells(self, board):
+        return [index for index in range(16) if not (board >> (4 * index)) & 0xF]
+
+    def place(self, board, index, exponent):
+        shift = 4 * index
+        return (board & ~(0xF << shift)) | (exponent << shift)
+
+    def exponents(self, board):
+        return bytes((board >> shift) & 0xF for shift in range(0, 64, 4))
+
+
+# ----------------------------------------------------------------------
+# NumPy engine
+# ----------------------------------------------------------------------
+
+class NumpyEngine(Engine):
+    """uint8 exponent arrays; every row of a board (or of a batch of boards) moves at once"""
+
+    name = "numpy"
+    max_exponent = 48  # Keeps the int64 score of a whole board from overflowing
+
+    def __init__(self, size=4):
+        if numpy is None:
+            raise RuntimeError("The numpy engine needs NumPy (pip install numpy)")
+        super().__init__(size)
+        self._cell_values = numpy.left_shift(1, numpy.arange(64, dtype=numpy.int64))
+        self._cell_values[0] = 0
+
+    def encode(self, grid):
+        cells = boards.encode(grid)
+        if max(cells) > self.max_exponent:
+            raise ValueError(f"The numpy engine only supports tiles up to 2**{self.max_exponent}")
+        return numpy.frombuffer(cells, dtype=numpy.uint8).reshape(self.size, self.size).copy()
+
+    def decode(self, board):
+        return boards.decode(board.tobytes(), self.size)
+
+    def move_rows_left(self, rows):
+        """
+        Move every row of an (..., width) exponent array to the left.
+        Returns (moved rows, score gained per leading index).
+        """
+        rows = numpy.asarray(rows, dtype=numpy.uint8)
+        flat = rows.reshape(-1, rows.shape[-1])
+
+        # Slide tiles to the left (stable sort keeps their order), then merge left to right
+        order = numpy.argsort(flat == 0, axis=1, kind="stable")
+        tiles = numpy.take_along_axis(flat, order, axis=1)
+        gained = numpy.zeros(len(flat), dtype=numpy.int64)
+        for column in range(tiles.shape[1] - 1):
+            merge = (tiles[:, column] != 0) & (tiles[:, column] == tiles[:, column + 1])
+            tiles[merge, column] += 1
+            tiles[merge, column + 1] = 0
+            gained += numpy.where(merge, self._cell_values[tiles[:, column]], 0)
+
+        # Close the gaps left by merged tiles
+        order = numpy.argsort(tiles == 0, axis=1, kind="stable")
+        tiles = numpy.take_along_axis(tiles, order, axis=1)
+
+        gained = gained.reshape(rows.shape[:-1])
+        return tiles.reshape(rows.shape), gained
+
+    def move_batch(self, batch, direction):
+        """
+        Apply one move to a batch of boards shaped (n, size, size).
+        Returns (new boards, score gained per board, changed per board).
+        """
+        batch = numpy.asarray(batch, dtype=numpy.uint8)
+        if direction == "left":
+            moved, gained = self.move_rows_left(batch)
+        elif direction == "right":
+            moved, gained = self.move_rows_left(batch[:, :, ::-1])
+            moved = moved[:, :, ::-1]
+        elif direction == "up":
+            moved, gained = self.move_rows_left(batch.transpose(0, 2, 1))
+            moved = moved.transpose(0, 2, 1)
+        elif direction == "down":
+            moved, gained = self.move_rows_left(batch.transpose(0, 2, 1)[:, :, ::-1])
+            moved = moved[:, :, ::-1].transpose(0, 2, 1)
+        else:
+            raise ValueError(f"Unknown move {direction!r}")
+
+        moved = numpy.ascontiguousarray(moved)
+        changed = (moved != batch).any(axis=(1, 2))
+        return moved, gained.sum(axis=1), changed
+
+    def move(self, board, direction):
+        moved, gained, changed = self.move_batch(board[numpy.newaxis], direction)
+        return moved[0], int(gained[0]), bool(changed[0])
+
+    def empty_cells(self, board):
+        return numpy.flatnonzero(board == 0).tolist()
+
+    def place(self, board, index, exponent):
+        new_board = board.copy()
+        new_board.flat[index] = exponent
+        return new_board
+
+    def exponents(self, board):
+        return board.tobytes()
+
+    def key(self, board):
+        return board.tobytes()
+
+
+ENGINES = {
+    "reference": ReferenceEngine,
+    "bytes": BytesEngine,
+    "packed": PackedEngine,
+    "numpy": NumpyEngine,
+}
+
+
+def get_engine(name=None, size=4):
+    """Return the engine called name (default: $AGENT2048_ENGINE or DEFAULT_ENGINE) for a board size"""
+    if name is None:
+        name = os.environ.get("AGENT2048_ENGINE", DEFAULT_ENGINE)
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name!r}, choose one of {', '.join(ENGINES)}")
+    return ENGINES[name](size)
+
+
+def available_engines(size=4):
+    """Names of the engines that can be used here for a board size"""
+    names = []
+    for name, engine_class in ENGINES.items():
+        try:
+            engine_class(size)
+        except (ValueError, RuntimeError):
+            continue
+        names.append(name)
+    return names
@@ -0,0 +1,184 @@
+"""Differential fuzzing of the engines against the reference engine
+
+Random positions are pushed through every available engine and all four moves; the
+resulting boards, score gained, validity, empty cells and tile placement must match the
+reference engine exactly. Half of the positions are random boards (biased towards equal
+neighbours so merges are frequent), the other half come from random playouts so
+realistic mid-game positions are covered as well.
+
+Run it with `agent2048 fuzz --positions 1000000 --workers 8`.
+"""
+import random
+from multiprocessing import Pool
+
+from .engine import ENGINES, MOVES, ReferenceEngine, available_engines, get_engine
+
+
+class FuzzMismatch(AssertionError):
+    """An engine disagreed with the reference engine"""
+
+
+def random_grid(rng, size, max_exponent):
+    """Random board whose tiles are drawn from a narrow band of values, so many of them merge"""
+    density = rng.random()
+    center = rng.randint(1, max_exponent)
+    spread = rng.choice((0, 1, 2, max_exponent))
+    low, high = max(1, center - spread), min(max_exponent, center + spread)
+    return [[1 << rng.randint(low, high) if rng.random() < density else 0 for _ in range(size)]
+            for _ in range(size)]
+
+
+class _Playout():
+    """Random game used as a source of realistic positions"""
+
+    def __init__(self, rng, size, max_exponent):
+        self.rng = rng
+        self.size = size
+        self.max_exponent = max_exponent
+        self.reference = ReferenceEngine(size)
+        self.reset()
+
+    def reset(self):
+        self.grid = [[0] * self.size for _ in range(self.size)]
+        for _ in range(2):
+            self._spawn()
+
+    def _spawn(self):
+        empty_cells = self.reference.empty_cells(self.grid)
+        cell = self.rng.choice(empty_cells)
+        self.grid = self.reference.place(self.grid, cell, 1 if self.rng.random() < 0.9 else 2)
+
+    def next_position(self):
+        children = self.reference.children(self.grid)
+        biggest = max(value for row in self.grid for value in row).bit_length() - 1
+        if not children or biggest >= self.max_exponent:
+            self.reset()  # Game over, or the next merge could overflow an engine
+        else:
+            _, self.grid = self.rng.choice(children)
+            self._spawn()
+        return self.grid
+
+
+def _fail(engine, grid, what, expected, got):
+    raise FuzzMismatch(
+        f"{engine.name} engine ({engine.size}x{engine.size}) differs from reference on {what}\n"
+        f"  board:    {grid}\n"
+        f"  expected: {expected!r}\n"
+        f"  got:      {got!r}"
+    )
+
+
+def check_position(reference, engines, grid, rng):
+    """Compare every engine with the reference engine on one position (raises FuzzMismatch)"""
+    expected_moves = {direction: reference.move(grid, direction) for direction in MOVES}
+    expected_empty = reference.empty_cells(grid)
+    expected_exponents = reference.exponents(grid)
+
+    # Also compare dropping a new tile into a random empty cell
+    placement = None
+    if expected_empty:
+        placement = (rng.choice(expected_empty), rng.randint(1, 2))
+        expected_placed = reference.place(grid, *placement)
+
+    for engine in engines:
+        board = engine.encode(grid)
+        if engine.exponents(board) != expected_exponents:
+            _fail(engine, grid, "encode", expected_exponents, engine.exponents(board))
+        if engine.decode(board) != grid:
+            _fail(engine, grid, "decode", grid, engine.decode(board))
+
+        for direction, (expected_grid, expected_reward, expected_changed) in expected_moves.items():
+            new_board, reward, changed = engine.move(board, direction)
+            got = (engine.decode(new_board), reward, changed)
+            if got != (expected_grid, expected_reward, expected_changed):
+                _fail(engine, grid, f"move {direction}", (expected_grid, expected_reward, expected_changed), got)
+
+        children = [direction for direction, _ in engine.children(board)]
+        expected_children = [direction for direction in MOVES if expected_moves[direction][2]]
+        if children != expected_children:
+            _fail(engine, grid, "valid moves", expected_children, children)
+
+        empty_cells = engine.empty_cells(board)
+        if empty_cells != expected_empty:
+            _fail(engine, grid, "empty cells", expected_empty, empty_cells)
+
+        if placement is not None:
+            placed = engine.decode(engine.place(board, *placement))
+            if placed != expected_placed:
+                _fail(engine, grid, f"place {placement}", expected_placed, placed)
+
+
+def biggest_tile_grids(size, exponent):
+    """Boards where tiles of the given exponent merge: two in a row and a column, and a full board"""
+    corner = [[0] * size for _ in range(size)]
+    corner[0][0] = corner[0][1] = corner[1][0] = 1 << exponent
+    full = [[1 << exponent] * size for _ in range(size)]
+    return [corner, full]
+
+
+def skipped_engines(engine_names, size):
+    """Names of engine_names that are not available for a board size"""
+    available = available_engines(size)
+    return [name for name in engine_names or () if name not in available]
+
+
+def run_fuzz(positions, sizes=(4, 5, 6), engine_names=None, seed=None):
+    """
+    Check positions random positions (spread over the board sizes) against the reference.
+    Engines not available for a size are skipped for it (see skipped_engines); unknown
+    names raise ValueError. Returns the number of positions checked per (size, engine name).
+    """
+    unknown = [name for name in engine_names or () if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown engine(s) {', '.join(unknown)}, choose from {', '.join(ENGINES)}")
+
+    rng = random.Random(seed)
+    setups = []
+    for size in sizes:
+        names = [name for name in (engine_names or available_engines(size)) if name != "reference"]
+        names = [name for name in names if name not in skipped_engines(engine_names, size)]
+        engines = [get_engine(name, size) for name in names]
+        reference = ReferenceEngine(size)
+
+        # Every engine must move boards holding the biggest tiles its encode accepts
+        for engine in engines:
+            for grid in biggest_tile_grids(size, engine.max_exponent):
+                check_position(reference, [engine], grid, rng)
+
+        # Keep every tile representable by all engines
+        max_exponent = min([engine.max_exponent for engine in engines], default=16)
+        setups.append((size, reference, engines, max_exponent,
+                       _Playout(rng, size, max_exponent)))
+
+    checked = {}
+    for index in range(positions):
+        size, reference, engines, max_exponent, playout = setups[index % len(setups)]
+        if rng.random() < 0.5:
+            grid = random_grid(rng, size, max_exponent)
+        else:
+            grid = playout.next_position()
+
+        check_position(reference, engines, grid, rng)
+        for engine in engines:
+            checked[(size, engine.name)] = checked.get((size, engine.name), 0) + 1
+
+    return checked
+
+
+def _run_chunk(args):
+    return run_fuzz(*args)
+
+
+def run_fuzz_parallel(positions, workers, sizes=(4, 5, 6), engine_names=None, seed=None):
+    """run_fuzz split over worker processes (each chunk gets its own seed)"""
+    seeds = random.Random(seed)
+    chunk = -(-positions // workers)
+    chunks = [(min(chunk, positions - start), sizes, engine_names, seeds.getrandbits(64))
+              for start in range(0, positions, chunk)]
+
+    checked = {}
+    with Pool(workers) as pool:
+        for result in pool.imap_unordered(_run_chunk, chunks):
+            for key, count in result.items():
+                checked[key] = checked.get(key, 0) + count
+    return checked
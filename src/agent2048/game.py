@@ -1,8 +1,11 @@
 # Import necessary libraries
 import pygame  # For game graphics and input handling
 import random  # For generating random tile positions and values
+import threading  # For cancelling a running AI search
+from concurrent.futures import ThreadPoolExecutor  # Runs the AI search off the render loop
 #from agent import Agent2048  # Commented out alternative agent implementation
-from agent import HeuristicAgent  # Import the AI agent with minimax algorithm
+from .agent import HeuristicAgent  # Import the AI agent with minimax algorithm
+from .engine import ReferenceEngine  # Rules for moving and merging tiles
 #from agen_Weights_MiniMax import HeuristicAgent  # Commented out alternative agent implementation
 
 # Initialize Pygame
@@ -14,9 +17,10 @@ pygame.init()
 
 # Define display dimensions and grid parameters
 width, height = 800, 800  # Window size in pixels
-grid_size = 4  # 4x4 grid for standard 2048 game
+grid_size = 4  # 4x4 grid for standard 2048 game (main() can use 5x5, 6x6...)
 background_color = (255, 255, 255)  # White background
 grid_color = (187, 173, 160)  # Grayish color for grid background
+frame_rate = 60  # Frames per second of the render loop
 
 # Dictionary mapping tile values to their colors (RGB format)
 # Colors are based on the original 2048 game design
@@ -32,73 +36,124 @@ TILE_COLORS = {
     256: (237, 204, 97),    # 256 tile - yellow
     512: (237, 200, 80),    # 512 tile - darker yellow
     1024: (237, 197, 63),   # 1024 tile - gold
-    2048: (237, 194, 46)    # 2048 tile - bright gold
+    2048: (237, 194, 46),   # 2048 tile - bright gold
+    4096: (94, 218, 146),   # 4096 tile - green (bigger boards get further)
+    8192: (37, 187, 100),   # 8192 tile - darker green
+    16384: (35, 140, 81),   # 16384 tile - forest green
+    32768: (113, 180, 213), # 32768 tile - light blue
+    65536: (25, 130, 202),  # 65536 tile - blue
 }
+SUPER_TILE_COLOR = (60, 58, 50)  # Any tile above the table - almost black
+dark_text_color = (0, 0, 0)  # Number color on light tiles
+light_text_color = (249, 246, 242)  # Number color on dark tiles (4096 and up)
 
 # Calculate tile size based on window dimensions and grid size
 tile_size = width // grid_size  # Each tile's width/height in pixels
 tile_padding = 8  # Padding between tiles for visual separation
 
-# Set up the game window
-window = pygame.display.set_mode((width, height))  # Create display surface
-pygame.display.set_caption("2048")  # Set window title
+# The game window is created by main() once the grid size is known
+window = None
+
+# Engine applying the moves (the same rules the agent searches with)
+reference_engine = ReferenceEngine()
 
 # -------------------------------------------------------------------------
 # HELPER FUNCTIONS FOR DRAWING AND UI
 # -------------------------------------------------------------------------
 
+# Caches of fonts and prerendered surfaces, so nothing is rebuilt every frame
+font_cache = {}  # Font size -> Font object
+tile_surface_cache = {}  # Tile value -> prerendered tile Surface
+game_over_overlay = None  # Prerendered game over overlay (without the score)
+
 def get_font(size):
     """
     Returns a font object with the specified size.
+    Fonts are created once and reused afterwards.
     
     :param size: Font size in points
     :return: Pygame Font object
     """
-    return pygame.font.Font(None, size)  # Use default pygame font with specified size
+    if size not in font_cache:
+        font_cache[size] = pygame.font.Font(None, size)  # Use default pygame font with specified size
+    return font_cache[size]
+
+def get_tile_surface(value):
+    """
+    Returns the prerendered surface for a tile value, including the padding around it.
+    Each surface is rendered the first time its value is needed.
+    
+    :param value: Tile value (0, 2, 4, 8, etc.)
+    :return: Pygame Surface of size tile_size x tile_size
+    """
+    if value in tile_surface_cache:
+        return tile_surface_cache[value]
+    
+    # The padding area shows the window background
+    surface = pygame.Surface((tile_size, tile_size))
+    surface.fill(background_color)
+    
+    # Create rectangle for the tile with rounded corners
+    tile_rect_size = tile_size - (2 * tile_padding)  # Size of tile after padding
+    tile_rect = pygame.Rect(tile_padding, tile_padding, tile_rect_size, tile_rect_size)
+    pygame.draw.rect(surface, TILE_COLORS.get(value, SUPER_TILE_COLOR), tile_rect, border_radius=5)
+    
+    # Draw the number on the tile (if not empty)
+    if value != 0:
+        # Font scales with the tile and shrinks for long numbers so they fit
+        font_size = min(tile_size // 4, int(tile_rect_size * 1.7 / len(str(value))))
+        font = get_font(font_size)  # Size for the number text
+        text_color = dark_text_color if value <= 2048 else light_text_color
+        text_surface = font.render(str(value), True, text_color)
+        text_rect = text_surface.get_rect(center=tile_rect.center)  # Center text in tile
+        surface.blit(text_surface, text_rect)
+    
+    tile_surface_cache[value] = surface
+    return surface
 
-def create_grid():
+def create_grid(size=None):
     """
-    Creates an empty 4x4 grid filled with zeros.
+    Creates an empty grid (grid_size x grid_size) filled with zeros.
     
+    :param size: Board width/height (defaults to grid_size)
     :return: 2D list representing the empty game board
     """
-    return [[0 for _ in range(grid_size)] for _ in range(grid_size)]
+    if size is None:
+        size = grid_size
+    return [[0 for _ in range(size)] for _ in range(size)]
 
 def draw_tile(x, y, value):
     """
     Draws a single tile on the game board.
     
-    :param x: Column index (0-3)
-    :param y: Row index (0-3)
+    :param x: Column index (0 to grid_size - 1)
+    :param y: Row index (0 to grid_size - 1)
     :param value: Tile value (0, 2, 4, 8, etc.)
+    :return: Pygame Rect of the window area that was drawn
     """
-    # Calculate tile position with padding applied
-    tile_x = x * tile_size + tile_padding  # X position with padding
-    tile_y = y * tile_size + tile_padding  # Y position with padding
-    tile_rect_size = tile_size - (2 * tile_padding)  # Size of tile after padding
-    
-    # Create rectangle for the tile with rounded corners
-    tile_rect = pygame.Rect(tile_x, tile_y, tile_rect_size, tile_rect_size)
-    pygame.draw.rect(window, TILE_COLORS[value], tile_rect, border_radius=5)
-    
-    # Draw the number on the tile (if not empty)
-    if value != 0:
-        font = get_font(50)  # Size for the number text
-        text_surface = font.render(str(value), True, (0, 0, 0))  # Render with black color
-        text_rect = text_surface.get_rect(center=tile_rect.center)  # Center text in tile
-        window.blit(text_surface, text_rect)  # Draw text on screen
+    # Copy the prerendered tile (padding included) to its cell
+    cell_rect = pygame.Rect(x * tile_size, y * tile_size, tile_size, tile_size)
+    window.blit(get_tile_surface(value), cell_rect)
+    return cell_rect
 
-def draw_grid(grid):
+def draw_grid(grid, previous_grid=None):
     """
-    Draws the entire game grid with all tiles.
+    Draws the game grid, skipping tiles that did not change.
     
     :param grid: 2D list representing the current game state
+    :param previous_grid: Grid currently on screen (None redraws every tile)
+    :return: List of Rects that were drawn, for pygame.display.update
     """
+    dirty_rects = []
+    
     # Iterate through each cell in the grid
     for y in range(grid_size):
         for x in range(grid_size):
-            # Draw each individual tile
-            draw_tile(x, y, grid[y][x])
+            # Only draw tiles whose value differs from what is on screen
+            if previous_grid is None or previous_grid[y][x] != grid[y][x]:
+                dirty_rects.append(draw_tile(x, y, grid[y][x]))
+    
+    return dirty_rects
 
 def draw_game_over(score):
     """
@@ -106,28 +161,33 @@ def draw_game_over(score):
     
     :param score: Final score of the game
     """
-    # Create semi-transparent overlay for the game over screen
-    overlay = pygame.Surface((width, height), pygame.SRCALPHA)  # Surface with alpha channel
-    overlay.fill((255, 255, 255, 128))  # Semi-transparent white
-    window.blit(overlay, (0, 0))  # Draw overlay on game window
+    global game_over_overlay
+    
+    # The overlay and the fixed texts are rendered once and reused
+    if game_over_overlay is None:
+        # Create semi-transparent overlay for the game over screen
+        game_over_overlay = pygame.Surface((width, height), pygame.SRCALPHA)  # Surface with alpha channel
+        game_over_overlay.fill((255, 255, 255, 128))  # Semi-transparent white
+        
+        # Draw "GAME OVER" text
+        game_over_font = get_font(100)  # Large font for game over text
+        game_over_text = game_over_font.render("GAME OVER!", True, (0, 0, 0))  # Black text
+        game_over_rect = game_over_text.get_rect(center=(width//2, height//2 - 100))  # Position text
+        game_over_overlay.blit(game_over_text, game_over_rect)  # Draw text
+        
+        # Show restart instructions
+        restart_font = get_font(50)  # Smaller font for instructions
+        restart_text = restart_font.render("Press SPACE to restart", True, (0, 0, 0))  # Black text
+        restart_rect = restart_text.get_rect(center=(width//2, height//2 + 150))  # Position at bottom
+        game_over_overlay.blit(restart_text, restart_rect)  # Draw text
     
-    # Draw "GAME OVER" text
-    game_over_font = get_font(100)  # Large font for game over text
-    game_over_text = game_over_font.render("GAME OVER!", True, (0, 0, 0))  # Black text
-    game_over_rect = game_over_text.get_rect(center=(width//2, height//2 - 100))  # Position text
-    window.blit(game_over_text, game_over_rect)  # Draw text
+    window.blit(game_over_overlay, (0, 0))  # Draw overlay on game window
     
     # Display final score
     score_font = get_font(70)  # Medium font for score text
     score_text = score_font.render(f"YOUR SCORE: {score}", True, (0, 0, 0))  # Black text
     score_rect = score_text.get_rect(center=(width//2, height//2 + 50))  # Position below game over
     window.blit(score_text, score_rect)  # Draw text
-    
-    # Show restart instructions
-    restart_font = get_font(50)  # Smaller font for instructions
-    restart_text = restart_font.render("Press SPACE to restart", True, (0, 0, 0))  # Black text
-    restart_rect = restart_text.get_rect(center=(width//2, height//2 + 150))  # Position at bottom
-    window.blit(restart_text, restart_rect)  # Draw text
 
 # -------------------------------------------------------------------------
 # GAME MECHANICS AND LOGIC FUNCTIONS
@@ -141,8 +201,9 @@ def initialize_board(grid):
     :return: Updated grid with two initial tiles
     """
     # Find all empty cells on the board
-    empty_cells = [(x, y) for y in range(grid_size) 
-                   for x in range(grid_size) if grid[y][x] == 0]
+    size = len(grid)  # Board width/height
+    empty_cells = [(x, y) for y in range(size) 
+                   for x in range(size) if grid[y][x] == 0]
     
     # Place two '2' tiles at random empty positions
     if len(empty_cells) >= 2:
@@ -163,39 +224,12 @@ def initialize_board(grid):
 def move_left(grid):
     """
     Move all tiles to the left and merge tiles with the same value.
-    This is the primary move function that other moves are derived from.
+    The rules live in the reference engine, shared with the agent.
     
     :param grid: 2D list representing the current game board
     :return: Updated grid after moving left
     """
-    # Create a deep copy of the grid to modify (avoid changing original)
-    new_grid = [row[:] for row in grid]
-    
-    # Process each row in the grid
-    for y in range(grid_size):
-        # Extract non-zero tiles from the row (remove empty spaces)
-        row = [tile for tile in new_grid[y] if tile != 0]
-        
-        # Merge adjacent tiles with same value
-        merged_row = []
-        i = 0
-        while i < len(row):
-            if i < len(row) - 1 and row[i] == row[i+1]:
-                # If current tile matches next tile, merge them (double value)
-                merged_row.append(row[i] * 2)
-                i += 2  # Skip the next tile since we merged it
-            else:
-                # If no merge, keep the tile as is
-                merged_row.append(row[i])
-                i += 1
-        
-        # Add zeros to fill the remaining space in the row
-        merged_row = merged_row + [0] * (grid_size - len(merged_row))
-        
-        # Update the row in the new grid
-        new_grid[y] = merged_row
-    
-    return new_grid
+    return reference_engine.move_left(grid)[0]
 
 def move_right(grid):
     """
@@ -204,70 +238,25 @@ def move_right(grid):
     :param grid: 2D list representing the current game board
     :return: Updated grid after moving right
     """
-    # Create a deep copy of the grid to modify
-    new_grid = [row[:] for row in grid]
-    
-    # Process each row in the grid
-    for y in range(grid_size):
-        # Extract non-zero tiles from the row (remove empty spaces)
-        row = [tile for tile in new_grid[y] if tile != 0]
-        
-        # Merge adjacent tiles with same value (right to left)
-        merged_row = []
-        i = len(row) - 1  # Start from rightmost tile
-        while i >= 0:
-            if i > 0 and row[i] == row[i-1]:
-                # If current tile matches previous tile, merge them
-                merged_row.insert(0, row[i] * 2)  # Insert at beginning to maintain order
-                i -= 2  # Skip the previous tile since we merged it
-            else:
-                # If no merge, keep the tile as is
-                merged_row.insert(0, row[i])
-                i -= 1
-        
-        # Add zeros to fill the remaining space (at the beginning for right move)
-        merged_row = [0] * (grid_size - len(merged_row)) + merged_row
-        
-        # Update the row in the new grid
-        new_grid[y] = merged_row
-    
-    return new_grid
+    return reference_engine.move_right(grid)[0]
 
 def move_up(grid):
     """
     Move all tiles up and merge tiles with the same value.
-    Uses transposition to reuse the left move logic.
     
     :param grid: 2D list representing the current game board
     :return: Updated grid after moving up
     """
-    # Transpose the grid (rows become columns)
-    # This allows reusing the left move logic for vertical movement
-    transposed = list(map(list, zip(*grid)))
-    
-    # Apply left move logic to the transposed grid
-    moved = move_left(transposed)
-    
-    # Transpose back to get the original orientation
-    return list(map(list, zip(*moved)))
+    return reference_engine.move_up(grid)[0]
 
 def move_down(grid):
     """
     Move all tiles down and merge tiles with the same value.
-    Uses transposition to reuse the right move logic.
     
     :param grid: 2D list representing the current game board
     :return: Updated grid after moving down
     """
-    # Transpose the grid (rows become columns)
-    # This allows reusing the right move logic for vertical movement
-    transposed = list(map(list, zip(*grid)))
-    
-    # Apply right move logic to the transposed grid
-    moved = move_right(transposed)
-    
-    # Transpose back to get the original orientation
-    return list(map(list, zip(*moved)))
+    return reference_engine.move_down(grid)[0]
 
 def check_game_over(grid):
     """
@@ -282,14 +271,15 @@ def check_game_over(grid):
         return False  # Game not over if empty cells exist
     
     # Check horizontal adjacency (can tiles be merged horizontally?)
-    for y in range(grid_size):
-        for x in range(grid_size - 1):
+    size = len(grid)  # Board width/height
+    for y in range(size):
+        for x in range(size - 1):
             if grid[y][x] == grid[y][x+1]:
                 return False  # Game not over if adjacent tiles can be merged
     
     # Check vertical adjacency (can tiles be merged vertically?)
-    for x in range(grid_size):
-        for y in range(grid_size - 1):
+    for x in range(size):
+        for y in range(size - 1):
             if grid[y][x] == grid[y+1][x]:
                 return False  # Game not over if adjacent tiles can be merged
     
@@ -314,8 +304,9 @@ def add_new_tile(grid):
     :return: Updated grid with a new tile
     """
     # Find all empty cells
-    empty_cells = [(x, y) for y in range(grid_size) 
-                    for x in range(grid_size) if grid[y][x] == 0]
+    size = len(grid)  # Board width/height
+    empty_cells = [(x, y) for y in range(size) 
+                    for x in range(size) if grid[y][x] == 0]
     
     # If there are empty cells, add a new tile
     if empty_cells:
@@ -334,10 +325,24 @@ def add_new_tile(grid):
 # MAIN GAME FUNCTION
 # -------------------------------------------------------------------------
 
-def main():
+def main(size=4):
     """
     Main game function that handles the game loop, user input, and AI mode.
+    
+    :param size: Board width/height (4 for the classic game, 5 or 6 for bigger boards)
     """
+    global grid_size, tile_size, window, game_over_overlay
+    
+    # Size the board and the tiles, dropping surfaces prerendered for another tile size
+    grid_size = size
+    tile_size = width // grid_size
+    tile_surface_cache.clear()
+    game_over_overlay = None
+    
+    # Set up the game window
+    window = pygame.display.set_mode((width, height))  # Create display surface
+    pygame.display.set_caption("2048")  # Set window title
+    
     # Create initial empty game grid
     game_grid = create_grid()
 
@@ -345,7 +350,7 @@ def main():
     game_grid = initialize_board(game_grid)
     
     # Create the AI agent for automated gameplay
-    agent = HeuristicAgent()
+    agent = HeuristicAgent(grid_size=grid_size)
     
     # Game state variables
     running = True  # Controls the main game loop
@@ -354,6 +359,25 @@ def main():
     ai_delay = 50  # Milliseconds delay between AI moves (for visualization)
     last_ai_move_time = 0  # Timestamp of the last AI move
     
+    # The AI search runs in a background thread so the window keeps rendering and
+    # handling events while it thinks; the loop polls the pending search every frame
+    search_executor = ThreadPoolExecutor(max_workers=1)
+    pending_search = None  # Future of the running search (None when idle)
+    search_stop = threading.Event()  # Set to abort the running search
+    clock = pygame.time.Clock()  # Keeps the loop at a steady frame rate
+    
+    # What is currently on screen, so frames where nothing changed draw nothing
+    drawn_grid = None  # Grid on screen (None forces a full redraw)
+    drawn_game_over = False  # Whether the game over screen is showing
+    
+    def cancel_search():
+        """Abort the running AI search (if any) and forget its result"""
+        nonlocal pending_search, search_stop
+        if pending_search is not None:
+            search_stop.set()
+            pending_search = None
+            search_stop = threading.Event()  # Fresh event for the next search
+    
     # Main game loop
     while running:
         current_time = pygame.time.get_ticks()  # Current time for AI move timing
@@ -362,10 +386,16 @@ def main():
         for event in pygame.event.get():
             # Handle window close event
             if event.type == pygame.QUIT:
+                cancel_search()
+                search_executor.shutdown(wait=False, cancel_futures=True)
                 pygame.quit()
                 import os
                 os._exit(0)  # Force immediate termination
             
+            # The window contents were lost (e.g. uncovered), redraw everything
+            if event.type == pygame.VIDEOEXPOSE:
+                drawn_grid = None
+            
             # Handle keyboard input
             if event.type == pygame.KEYDOWN:
                 if game_over:
@@ -381,6 +411,10 @@ def main():
                         ai_mode = not ai_mode
                         print(f"AI mode: {'ON' if ai_mode else 'OFF'}")
                         
+                        # Turning the AI off cancels a search that is still running
+                        if not ai_mode:
+                            cancel_search()
+                        
                         # Display current board state when AI mode is activated
                         if ai_mode:
                             agent.print_board_state(game_grid)
@@ -412,9 +446,16 @@ def main():
                                 game_over = True
         
         # AI move handling (when AI mode is active)
-        if ai_mode and not game_over and current_time - last_ai_move_time >= ai_delay:
-            # Get the AI agent's decision based on current board state
-            move = agent.make_decision(game_grid)
+        if ai_mode and not game_over and pending_search is None \
+                and current_time - last_ai_move_time >= ai_delay:
+            # Start searching on a copy of the board so the loop can keep going
+            board_copy = [row[:] for row in game_grid]
+            pending_search = search_executor.submit(agent.make_decision, board_copy, search_stop)
+        
+        if pending_search is not None and pending_search.done():
+            # Get the AI agent's decision once the background search has finished
+            move = pending_search.result()
+            pending_search = None
             
             # Apply the chosen move if one was returned
             if move:
@@ -444,23 +485,37 @@ def main():
                     print(f"Final Score: {calculate_score(game_grid)}")
             
             # Update timing for the next AI move
-            last_ai_move_time = current_time
+            last_ai_move_time = pygame.time.get_ticks()
 
-        # Rendering code - draw the game state
-        # Clear the screen with background color
-        window.fill(background_color)
+        # Rendering code - draw the game state only when it changed
+        if drawn_grid is None or game_over != drawn_game_over:
+            # Full redraw: clear the screen with background color
+            window.fill(background_color)
 
-        # Draw the current game grid
-        draw_grid(game_grid)
+            # Draw the current game grid
+            draw_grid(game_grid)
 
-        # If game over, draw the game over screen
-        if game_over:
-            draw_game_over(calculate_score(game_grid))
+            # If game over, draw the game over screen
+            if game_over:
+                draw_game_over(calculate_score(game_grid))
 
-        # Update the display to show the new frame
-        pygame.display.update()
+            # Update the display to show the new frame
+            pygame.display.update()
+        elif game_grid != drawn_grid:
+            # Only redraw the tiles that changed and push just those areas to the screen
+            dirty_rects = draw_grid(game_grid, drawn_grid)
+            pygame.display.update(dirty_rects)
+        
+        # Remember what is on screen now
+        drawn_grid = [row[:] for row in game_grid]
+        drawn_game_over = game_over
+        
+        # Wait for the next frame (also yields the CPU to the AI search)
+        clock.tick(frame_rate)
     
     # Clean up resources when the game loop exits
+    cancel_search()
+    search_executor.shutdown(wait=False, cancel_futures=True)
     pygame.quit()
 
 # Entry point - run the game if script is executed directly
@@ -0,0 +1,242 @@
+"""Profiling of a single decision, with collapsed-stack output for flame graphs
+
+A profiler is attached around one HeuristicAgent.make_decision call and turns what it
+measured into collapsed stacks ("outer;inner;innermost weight" per line), the input
+format of flamegraph.pl, speedscope and inferno. Three profilers are available:
+
+    cprofile    cProfile; it only records caller/callee pairs, so stacks are two frames deep
+    sampling    samples the full Python stack on a SIGPROF timer (Unix only), weight = samples
+    components  times the agent's own steps (move generation, chance expansion, leaf evaluation
+                and each of its terms), weight = microseconds of self time
+"""
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import time
+from contextlib import contextmanager
+
+from . import board as boards
+from .agent import HeuristicAgent
+
+
+class Profiler():
+    """Base class: attach() wraps the profiled code, collapsed() returns {stack: weight}"""
+
+    name = None
+    unit = None  # What the weights count
+
+    @contextmanager
+    def attach(self, agent):
+        self.start(agent)
+        try:
+            yield self
+        finally:
+            self.stop(agent)
+
+    def start(self, agent):
+        raise NotImplementedError
+
+    def stop(self, agent):
+        raise NotImplementedError
+
+    def collapsed(self):
+        raise NotImplementedError
+
+
+def _label(filename, line, name):
+    """Frame name used in stacks (';' separates frames, so it must not appear in one)"""
+    if filename == "~":  # Built-in function
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+class CProfileProfiler(Profiler):
+    """Deterministic profiling with cProfile; weights are microseconds of self time"""
+
+    name = "cprofile"
+    unit = "us"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self, agent):
+        self.profile.enable()
+
+    def stop(self, agent):
+        self.profile.disable()
+
+    def collapsed(self):
+        stacks = {}
+        for function, (_, _, self_time, _, callers) in pstats.Stats(self.profile).stats.items():
+            callee = _label(*function)
+            if not callers:
+                stacks[callee] = stacks.get(callee, 0) + self_time
+            # Self time of the function split by the caller it was called from
+            for caller, (_, _, caller_self_time, _) in callers.items():
+                stack = f"{_label(*caller)};{callee}"
+                stacks[stack] = stacks.get(stack, 0) + caller_self_time
+        return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if seconds > 0}
+
+
+class SamplingProfiler(Profiler):
+    """Statistical profiling: a SIGPROF timer samples the Python stack every interval seconds"""
+
+    name = "sampling"
+    unit = "samples"
+
+    def __init__(self, interval=0.001):
+        if not hasattr(signal, "setitimer"):
+            raise RuntimeError("The sampling profiler needs signal.setitimer (Unix)")
+        self.interval = interval
+        self.samples = {}
+        self._previous_handler = None
+        self._base_depth = 0
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(_label(code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        # Drop the frames outside the profiled code
+        stack = stack[::-1][self._base_depth:]
+        if stack:
+            key = ";".join(stack)
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    @contextmanager
+    def attach(self, agent):
+        # Samples only keep the frames below the code using attach()
+        caller = sys._getframe(2)  # 0: this generator, 1: contextmanager.__enter__
+        self._base_depth = 0
+        while caller is not None:
+            self._base_depth += 1
+            caller = caller.f_back
+
+        self.start(agent)
+        try:
+            yield self
+        finally:
+            self.stop(agent)
+
+    def start(self, agent):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self, agent):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def collapsed(self):
+        return dict(self.samples)
+
+
+class ComponentProfiler(Profiler):
+    """Times the search steps of one agent; weights are microseconds of self time"""
+
+    name = "components"
+    unit = "us"
+
+    # Agent methods timed, with the component name shown in the stacks
+    AGENT_COMPONENTS = {
+        "_make_decision": "make_decision",
+        "_search": "search",
+        "_max_node": "max_node",
+        "_chance_node": "chance_expansion",
+        "_evaluate_board": "evaluate_board",
+        "_evaluate_exponents": "evaluate_exponents",
+        "_line_terms_exponents": "line_terms",  # Tile sum, monotonicity, smoothness, merge
+        "_empty_exponents": "empty",
+        "_corner_exponents": "corner",
+        "_closeness_exponents": "closeness",
+    }
+    # Engine methods timed (board representation work)
+    ENGINE_COMPONENTS = {
+        "encode": "encode",
+        "decode": "decode",
+        "children": "move_generation",
+        "empty_cells": "empty_cells",
+        "place": "place_tile",
+    }
+
+    def __init__(self):
+        self.times = {}  # Stack -> nanoseconds of self time
+        self._stack = []  # Components currently running
+        self._child_time = []  # Time spent in timed children, per running component
+        self._patched = []
+
+    def _wrap(self, component, function):
+        stack = self._stack
+        child_time = self._child_time
+        times = self.times
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            stack.append(component)
+            child_time.append(0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                key = ";".join(stack)
+                times[key] = times.get(key, 0) + elapsed - child_time.pop()
+                stack.pop()
+                if child_time:
+                    child_time[-1] += elapsed
+
+        return timed
+
+    def start(self, agent):
+        for target, components in ((agent, self.AGENT_COMPONENTS), (agent.engine, self.ENGINE_COMPONENTS)):
+            for method, component in components.items():
+                if hasattr(target, method):
+                    # Instance attributes shadow the methods until stop() removes them
+                    setattr(target, method, self._wrap(component, getattr(target, method)))
+                    self._patched.append((target, method))
+
+    def stop(self, agent):
+        for target, method in self._patched:
+            delattr(target, method)
+        self._patched = []
+
+    def collapsed(self):
+        return {stack: round(ns / 1000) for stack, ns in self.times.items() if ns >= 500}
+
+
+PROFILERS = {
+    "cprofile": CProfileProfiler,
+    "sampling": SamplingProfiler,
+    "components": ComponentProfiler,
+}
+
+
+def profile_decision(encoded_board, profiler="components", repeat=1, search_depth=None, engine=None):
+    """
+    Replay make_decision on one position (in the board text form, see board.from_string)
+    under a profiler. Returns (profiler, chosen move, seconds per decision).
+    """
+    if repeat < 1:
+        raise ValueError("repeat must be at least 1")
+    board, size = boards.from_string(encoded_board)
+    grid = boards.decode(board, size)
+    agent = HeuristicAgent(grid_size=size, verbose=False, search_depth=search_depth, engine=engine)
+    if isinstance(profiler, str):
+        profiler = PROFILERS[profiler]()
+
+    start = time.perf_counter()
+    with profiler.attach(agent):
+        for _ in range(repeat):
+            agent.evaluation_cache.clear()  # Every run does the full amount of work
+            move = agent.make_decision(grid)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    return profiler, move, elapsed
+
+
+def write_collapsed(stacks, out):
+    """Write {stack: weight} as collapsed-stack lines, heaviest first"""
+    for stack, weight in sorted(stacks.items(), key=lambda item: item[1], reverse=True):
+        out.write(f"{stack} {weight}\n")
@@ -0,0 +1,234 @@
+"""Self-play dataset export: the agent plays headless games and every decision is recorded
+
+Positions are written to shards (selfplay-00000.npy, selfplay-00001.npy, ...) holding a
+one-dimensional structured array with fixed-width records, so a dataset can be opened
+without parsing, e.g. numpy.load(path, mmap_mode="r"). Every record contains:
+
+    board           uint8[size * size]  tile exponents before the move (0 = empty, 1 = 2, ...)
+    move            uint8               chosen move, index into MOVES (up, down, left, right)
+    value           float64             expectimax score of the chosen move
+    move_values     float64[4]          expectimax score of every move (NaN if invalid)
+    final_score     int64               sum of the tiles when the game ended
+    final_max_tile  uint8               exponent of the biggest tile when the game ended
+    moves_left      uint32              moves played after this position until the game ended
+
+Only the games being played (at most two per worker) and one shard header are kept in
+memory at a time, so datasets of any size can be produced. NumPy is not needed to write
+the shards.
+"""
+import ast
+import math
+import os
+import random
+import struct
+from collections import deque
+from multiprocessing import Pool
+
+from . import board as boards
+from .agent import HeuristicAgent
+from .ttable import SharedTranspositionTable
+
+MOVES = boards.MOVES
+
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+_SHAPE_DIGITS = 20  # Room reserved in the header so the final record count can be patched in
+
+
+def record_format(size):
+    """struct format of one record for a board size"""
+    return f"<{size * size}sBd{len(MOVES)}dqBI"
+
+
+def record_descr(size):
+    """NumPy dtype description matching record_format"""
+    return [
+        ("board", "|u1", (size * size,)),
+        ("move", "|u1"),
+        ("value", "<f8"),
+        ("move_values", "<f8", (len(MOVES),)),
+        ("final_score", "<i8"),
+        ("final_max_tile", "|u1"),
+        ("moves_left", "<u4"),
+    ]
+
+
+def _npy_header(size, count):
+    """.npy (version 1.0) header for count records, always the same length for a board size"""
+    shape = f"({count},)".ljust(_SHAPE_DIGITS + 3)
+    header = f"{{'descr': {record_descr(size)!r}, 'fortran_order': False, 'shape': {shape}, }}"
+    # Magic + version + length field + header + newline must be a multiple of 64 bytes
+    padding = -(len(_NPY_MAGIC) + 2 + len(header) + 1) % 64
+    header = header + " " * padding + "\n"
+    return _NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def read_shard_header(path):
+    """Return (descr, record count) of a shard, without NumPy"""
+    with open(path, "rb") as shard:
+        if shard.read(len(_NPY_MAGIC)) != _NPY_MAGIC:
+            raise ValueError(f"{path} is not a version 1.0 .npy file")
+        (length,) = struct.unpack("<H", shard.read(2))
+        header = ast.literal_eval(shard.read(length).decode("latin1"))
+    return header["descr"], header["shape"][0]
+
+
+class ShardWriter():
+    """Writes packed records into .npy shards of at most shard_size records each"""
+
+    def __init__(self, out_dir, size, shard_size=1 << 16, prefix="selfplay"):
+        if shard_size < 1:
+            raise ValueError("shard_size must be at least 1")
+        self.out_dir = out_dir
+        self.size = size
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self.record_size = struct.calcsize(record_format(size))
+
+        self.paths = []  # Every shard written so far
+        self.total_records = 0
+        self._file = None
+        self._count = 0  # Records in the open shard
+
+        os.makedirs(out_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_shard(self):
+        path = os.path.join(self.out_dir, f"{self.prefix}-{len(self.paths):05d}.npy")
+        self._file = open(path, "wb")
+        self._file.write(_npy_header(self.size, 0))
+        self._count = 0
+        self.paths.append(path)
+
+    def _close_shard(self):
+        # Patch the real record count into the header (it has the same length)
+        self._file.seek(0)
+        self._file.write(_npy_header(self.size, self._count))
+        self._file.close()
+        self._file = None
+
+    def write(self, records):
+        """Append packed records (bytes, a multiple of record_size long)"""
+        view = memoryview(records)
+        while len(view):
+            if self._file is None:
+                self._open_shard()
+            count = min(len(view) // self.record_size, self.shard_size - self._count)
+            self._file.write(view[:count * self.record_size])
+            view = view[count * self.record_size:]
+            self._count += count
+            self.total_records += count
+            if self._count == self.shard_size:
+                self._close_shard()
+
+    def close(self):
+        if self._file is not None:
+            self._close_shard()
+
+
+def play_game(agent, rng, size=4):
+    """
+    Play one headless game with the agent; returns the packed records of all its positions.
+    Tiles are spawned like in the game: two 2s to start, then a 2 (90%) or a 4 (10%).
+    """
+    record = struct.Struct(record_format(size))
+
+    board = bytes(size * size)
+    for cell in rng.sample(range(size * size), 2):
+        board = boards.place(board, cell, 1)
+
+    positions = []  # (board, move index, value, move values) until the outcome is known
+    while True:
+        move = agent.make_decision(boards.decode(board, size))
+        if move is None:
+            break  # No valid moves: game over
+
+        scores = agent.last_move_scores
+        move_values = [scores.get(name, math.nan) for name in MOVES]
+        positions.append((board, MOVES.index(move), scores[move], move_values))
+
+        board, _ = boards.move(board, size, move)
+        empty_cells = boards.empty_cells(board)
+        board = boards.place(board, rng.choice(empty_cells), 1 if rng.random() < 0.9 else 2)
+
+    final_score = sum(1 << exponent for exponent in board if exponent)
+    final_max_tile = max(board)
+
+    packed = bytearray()
+    for played, (position, move, value, move_values) in enumerate(positions):
+        moves_left = len(positions) - played - 1
+        packed += record.pack(position, move, value, *move_values, final_score, final_max_tile, moves_left)
+    return bytes(packed)
+
+
+# Agent of the worker processes (set once per process by the pool initializer)
+_worker_agent = None
+
+
+def _init_worker(agent):
+    global _worker_agent
+    _worker_agent = agent
+
+
+def _play_seeded_game(args):
+    seed, size = args
+    return play_game(_worker_agent, random.Random(seed), size)
+
+
+def export_selfplay(out_dir, games, size=4, shard_size=1 << 16, seed=None, search_depth=None,
+                    workers=1, table_buckets=0):
+    """
+    Play games and stream their positions into shards in out_dir.
+    With workers > 1 games are played in parallel processes; table_buckets > 0 gives them a
+    shared transposition table. Returns the list of shard paths.
+
+    A seed makes the dataset reproducible only without a shared table: a probe returns
+    whatever another game or process stored first (possibly from a deeper search), so the
+    decisions depend on timing and on the number of workers.
+    """
+    table = SharedTranspositionTable.create(table_buckets) if table_buckets > 0 else None
+    agent = HeuristicAgent(grid_size=size, transposition_table=table, verbose=False,
+                           search_depth=search_depth)
+
+    # Every game gets its own seed so, without a shared table, results do not depend on the
+    # number of workers
+    seeds = random.Random(seed)
+    game_args = ((seeds.getrandbits(64), size) for _ in range(games))
+
+    try:
+        with ShardWriter(out_dir, size, shard_size) as writer:
+            if workers > 1:
+                with Pool(workers, initializer=_init_worker, initargs=(agent,)) as pool:
+                    # At most two games per worker are submitted ahead of the one written next,
+                    # so a long game only holds up a bounded number of finished ones
+                    pending = deque()
+                    played = 0
+                    for args in game_args:
+                        pending.append(pool.apply_async(_play_seeded_game, (args,)))
+                        if len(pending) >= 2 * workers:
+                            played += 1
+                            writer.write(pending.popleft().get())
+                            _report_progress(played, games, writer)
+                    while pending:
+                        played += 1
+                        writer.write(pending.popleft().get())
+                        _report_progress(played, games, writer)
+            else:
+                _init_worker(agent)
+                for played, args in enumerate(game_args, 1):
+                    writer.write(_play_seeded_game(args))
+                    _report_progress(played, games, writer)
+    finally:
+        if table is not None:
+            table.close()
+            table.unlink()
+
+    return writer.paths
+
+
+def _report_progress(played, games, writer):
+    print(f"Game {played}/{games}: {writer.total_records} positions in {len(writer.paths)} shard(s)")
@@ -0,0 +1,311 @@
+"""Local evaluation service: answers agent queries over a TCP or Unix socket (JSON lines)
+
+Every request is one JSON object per line:
+
+    {"id": 1, "op": "evaluate_grid", "grid": [[0, 2, 0, 0], ...], "deadline_ms": 50}
+    {"id": 2, "op": "make_decision", "grid": [[0, 2, 0, 0], ...]}
+
+and gets one response line with the same id:
+
+    {"id": 1, "result": 1234.5}
+    {"id": 2, "error": "deadline exceeded"}
+
+Requests arriving within a short window (from any connection) are processed as one batch:
+all evaluate_grid requests of a batch go through a single HeuristicAgent.evaluate_grids call
+(array operations over the whole batch when NumPy is installed). Evaluations and searches
+have separate queues and worker threads, so a long make_decision never holds up an
+evaluate_grid request. A request that fails gets {"error": ...} without affecting the others.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .agent import HeuristicAgent
+
+OPERATIONS = ("evaluate_grid", "make_decision")
+
+
+class RequestError(Exception):
+    """A request that cannot be answered (reported back to the client)"""
+
+
+class _PendingRequest():
+    """A parsed request waiting in the batch queue"""
+
+    def __init__(self, op, grid, deadline, future):
+        self.op = op
+        self.grid = grid
+        self.deadline = deadline  # time.monotonic() value, or None
+        self.future = future
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+class EvaluationServer():
+    """Keeps one warmed-up agent alive and micro-batches the requests of all clients"""
+
+    def __init__(self, agent=None, batch_window_ms=2.0, max_batch=64, default_deadline_ms=None):
+        self.agent = agent if agent is not None else HeuristicAgent(verbose=False)
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.default_deadline_ms = default_deadline_ms
+
+        # One queue and one worker thread per operation: searches are not thread safe and run
+        # one at a time, evaluate_grid only reads the agent so it can run next to a search
+        self._executors = {op: ThreadPoolExecutor(max_workers=1) for op in OPERATIONS}
+        self._queues = {}
+        self._batch_tasks = []
+
+    # ------------------------------------------------------------------
+    # Request parsing
+    # ------------------------------------------------------------------
+
+    def _parse_grid(self, grid):
+        size = self.agent.grid_size
+        max_exponent = self.agent.engine.max_exponent
+        if not isinstance(grid, list) or len(grid) != size:
+            raise RequestError(f"grid must be a list of {size} rows")
+        for row in grid:
+            if not isinstance(row, list) or len(row) != size:
+                raise RequestError(f"every row must be a list of {size} tiles")
+            for value in row:
+                if not isinstance(value, int) or value < 0 or value == 1 or value & (value - 1):
+                    raise RequestError("tiles must be 0 or a power of two")
+                if value.bit_length() - 1 > max_exponent:
+                    raise RequestError(f"tiles above 2**{max_exponent} are not supported by the "
+                                       f"{self.agent.engine.name} engine")
+        return grid
+
+    def _parse_request(self, message):
+        if not isinstance(message, dict):
+            raise RequestError("request must be a JSON object")
+
+        op = message.get("op")
+        if op not in OPERATIONS:
+            raise RequestError(f"op must be one of {', '.join(OPERATIONS)}")
+
+        grid = self._parse_grid(message.get("grid"))
+
+        deadline_ms = message.get("deadline_ms", self.default_deadline_ms)
+        if deadline_ms is None:
+            deadline = None
+        elif isinstance(deadline_ms, (int, float)) and deadline_ms > 0:
+            deadline = time.monotonic() + deadline_ms / 1000
+        else:
+            raise RequestError("deadline_ms must be a positive number")
+
+        return op, grid, deadline
+
+    # ------------------------------------------------------------------
+    # Batching
+    # ------------------------------------------------------------------
+
+    async def _collect_batch(self, queue):
+        """Wait for one request, then gather whatever else arrives within the batch window"""
+        batch = [await queue.get()]
+        window_end = time.monotonic() + self.batch_window
+
+        while len(batch) < self.max_batch:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _batch_loop(self, op):
+        loop = asyncio.get_running_loop()
+        run_batch = self._run_evaluations if op == "evaluate_grid" else self._run_decisions
+        while True:
+            batch = await self._collect_batch(self._queues[op])
+            try:
+                results = await loop.run_in_executor(self._executors[op], run_batch, batch)
+            except Exception as error:  # Keep serving whatever went wrong
+                results = [_error_response(error)] * len(batch)
+            for request, result in zip(batch, results):
+                if not request.future.done():  # The client may have gone away
+                    request.future.set_result(result)
+
+    def _run_evaluations(self, batch):
+        """Answer a batch of evaluate_grid requests (runs on the evaluation thread)"""
+        results = [None] * len(batch)
+
+        # One batched evaluation for the whole batch, identical grids evaluated once
+        evaluations = {}
+        for index, request in enumerate(batch):
+            if request.expired():
+                results[index] = {"error": "deadline exceeded"}
+            else:
+                evaluations.setdefault(_grid_key(request.grid), []).append(index)
+
+        if evaluations:
+            grids = [[list(row) for row in key] for key in evaluations]
+            try:
+                responses = [{"result": score} for score in self.agent.evaluate_grids(grids)]
+            except Exception:
+                # Find the grids that fail, the others still get their score
+                responses = [self._evaluate(grid) for grid in grids]
+            for indices, response in zip(evaluations.values(), responses):
+                for index in indices:
+                    results[index] = response
+
+        return results
+
+    def _evaluate(self, grid):
+        try:
+            return {"result": self.agent.evaluate_grid(grid)}
+        except Exception as error:
+            return _error_response(error)
+
+    def _run_decisions(self, batch):
+        """Answer a batch of make_decision requests (runs on the search thread)"""
+        results = [None] * len(batch)
+
+        # Searches run one after another, each one stopped when its deadline passes
+        decisions = {}
+        for index, request in enumerate(batch):
+            key = _grid_key(request.grid)
+            if key in decisions:
+                results[index] = decisions[key]
+                continue
+            results[index] = self._decide(request)
+            if "result" in results[index]:
+                decisions[key] = results[index]
+
+        return results
+
+    def _decide(self, request):
+        if request.expired():
+            return {"error": "deadline exceeded"}
+
+        stop_event = threading.Event()
+        timer = None
+        if request.deadline is not None:
+            timer = threading.Timer(request.deadline - time.monotonic(), stop_event.set)
+            timer.start()
+        try:
+            move = self.agent.make_decision(request.grid, stop_event)
+        except Exception as error:
+            return _error_response(error)
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        if stop_event.is_set():
+            return {"error": "deadline exceeded"}
+        return {"result": move}
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    async def submit(self, message):
+        """Answer one decoded request message; returns the response payload (without id)"""
+        try:
+            op, grid, deadline = self._parse_request(message)
+        except RequestError as error:
+            return {"error": str(error)}
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[op].put(_PendingRequest(op, grid, deadline, future))
+
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            # shield() keeps the future alive so the batch loop can still resolve it
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return {"error": "deadline exceeded"}
+
+    async def _answer(self, line, writer, write_lock):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message, response = None, {"error": "invalid JSON"}
+        else:
+            response = await self.submit(message)
+
+        if isinstance(message, dict) and "id" in message:
+            response = {"id": message["id"], **response}
+
+        async with write_lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def handle_client(self, reader, writer):
+        """Serve one connection; requests are answered concurrently, possibly out of order"""
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self._answer(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=2048, unix_path=None):
+        """Start listening and serve until cancelled"""
+        self._queues = {op: asyncio.Queue() for op in OPERATIONS}
+        self._batch_tasks = [asyncio.create_task(self._batch_loop(op)) for op in OPERATIONS]
+
+        # Warm up the agent before accepting clients
+        size = self.agent.grid_size
+        self.agent.evaluate_grids([[[0] * size for _ in range(size)]])
+
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix_path)
+            print(f"Serving on unix socket {unix_path}")
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            print(f"Serving on {host}:{port}")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in self._batch_tasks:
+                task.cancel()
+            for executor in self._executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            if unix_path is not None and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+
+def _grid_key(grid):
+    return tuple(tuple(row) for row in grid)
+
+
+def _error_response(error):
+    """Response for a request whose evaluation raised"""
+    return {"error": f"{type(error).__name__}: {error}"}
+
+
+def run_server(host="127.0.0.1", port=2048, unix_path=None, batch_window_ms=2.0,
+               max_batch=64, default_deadline_ms=None, grid_size=4):
+    """Run the evaluation server until interrupted (used by `agent2048 serve`)"""
+    server = EvaluationServer(
+        HeuristicAgent(grid_size=grid_size, verbose=False),
+        batch_window_ms=batch_window_ms,
+        max_batch=max_batch,
+        default_deadline_ms=default_deadline_ms,
+    )
+    try:
+        asyncio.run(server.serve(host, port, unix_path))
+    except KeyboardInterrupt:
+        pass
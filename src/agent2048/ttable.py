@@ -0,0 +1,207 @@
+"""Transposition table stored in shared memory so several search processes can share it"""
+import hashlib
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+# Header layout (in 64-bit words): magic, number of buckets, slots per bucket, reserved
+_MAGIC = int.from_bytes(b"A2048TT1", "little")
+_HEADER_WORDS = 4
+# Every slot holds three 64-bit words: check, value bits and a node word
+# ((depth + 1) << 1 | 1 for chance nodes; 0 means empty)
+_SLOT_WORDS = 3
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15  # Multiplier used to spread keys across buckets
+_DOUBLE = struct.Struct("<d")
+_WORD = struct.Struct("<Q")
+
+
+def board_key(cells):
+    """
+    Return a deterministic 64-bit key for a board given as a flat sequence of tile exponents.
+    4x4 boards with exponents below 16 are packed exactly, other boards are hashed (two of
+    them can share a key, with a chance of about 2**-64 per pair). Only one board size is
+    packed, so boards of different sizes sharing a table do not collide. Python's hash()
+    is not used because it is salted per process.
+    """
+    cells = bytes(cells)
+    if len(cells) == 16 and max(cells) < 16:
+        key = 0
+        for exponent in cells:
+            key = (key << 4) | exponent
+        return key
+    return int.from_bytes(hashlib.blake2b(cells, digest_size=8).digest(), "little")
+
+
+def _node_word(depth, player_turn):
+    """Depth and side to move of an entry, as stored in its slot"""
+    return (depth + 1) << 1 | (not player_turn)
+
+
+class SharedTranspositionTable():
+    """
+    Fixed-size, bucketed transposition table living in multiprocessing.shared_memory.
+
+    Any number of processes on the same host can attach to the same table by name.
+    Access is lockless: every slot stores check = key ^ value_bits ^ node, where node holds
+    the depth and the side to move, so a slot that is torn by two processes writing at the
+    same time simply fails verification and is treated as a miss. Max nodes and chance
+    nodes of the same board are separate entries. Entries are only replaced by searches
+    that are at least as deep.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self._owner = owner
+        self._words = shm.buf.cast("Q")
+
+        if self._words[0] != _MAGIC:
+            self._release_views()
+            raise ValueError(f"Shared memory block {shm.name!r} is not a transposition table")
+
+        self.num_buckets = self._words[1]
+        self.bucket_slots = self._words[2]
+
+        # Per-process statistics (not shared)
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @classmethod
+    def create(cls, num_buckets=1 << 16, bucket_slots=4, name=None):
+        """Allocate a new table; the creating process is responsible for unlink()"""
+        if num_buckets < 1 or bucket_slots < 1:
+            raise ValueError("num_buckets and bucket_slots must be positive")
+
+        size = 8 * (_HEADER_WORDS + num_buckets * bucket_slots * _SLOT_WORDS)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)  # Not every platform hands out zeroed memory
+
+        words = shm.buf.cast("Q")
+        words[1] = num_buckets
+        words[2] = bucket_slots
+        words[0] = _MAGIC  # Written last so attachers never see a half-initialised header
+        words.release()
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to a table created by another process"""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers every attachment with the resource tracker, which would
+            # unlink the block when this process exits even though it does not own it
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __reduce__(self):
+        # Pickling (e.g. sending an agent to a worker process) re-attaches by name
+        return (SharedTranspositionTable.attach, (self.name,))
+
+    def __del__(self):
+        # Exported buffer views keep SharedMemory from closing its mapping
+        self._release_views()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def _bucket_start(self, key):
+        bucket = ((key * _GOLDEN) & _MASK64) % self.num_buckets
+        return _HEADER_WORDS + bucket * self.bucket_slots * _SLOT_WORDS
+
+    def probe(self, key, depth, player_turn=True):
+        """Return the stored value for key if it was searched at least depth plies deep, else None"""
+        words = self._words
+        self.probes += 1
+        chance = not player_turn
+
+        offset = self._bucket_start(key)
+        for _ in range(self.bucket_slots):
+            check, value_bits, node = words[offset], words[offset + 1], words[offset + 2]
+            if node and check ^ value_bits ^ node == key and node & 1 == chance:
+                if (node >> 1) - 1 >= depth:
+                    # Re-check in case another process replaced the slot while we read it
+                    if words[offset] == check and words[offset + 2] == node:
+                        self.hits += 1
+                        return _DOUBLE.unpack(_WORD.pack(value_bits))[0]
+                return None
+            offset += _SLOT_WORDS
+
+        return None
+
+    def store(self, key, depth, value, player_turn=True):
+        """Store value for key unless the bucket already holds deeper information"""
+        words = self._words
+        new_node = _node_word(depth, player_turn)
+        new_depth = new_node >> 1
+        chance = not player_turn
+
+        offset = self._bucket_start(key)
+        victim = None
+        victim_depth = None
+        for _ in range(self.bucket_slots):
+            check, value_bits, node = words[offset], words[offset + 1], words[offset + 2]
+            stored_depth = node >> 1
+            if node and check ^ value_bits ^ node == key and node & 1 == chance:
+                # Same position: only overwrite with a deeper search
+                if new_depth <= stored_depth:
+                    return False
+                victim = offset
+                break
+            if victim is None or stored_depth < victim_depth:
+                victim = offset
+                victim_depth = stored_depth
+            offset += _SLOT_WORDS
+        else:
+            # Different positions: evict the shallowest slot, newest wins on ties
+            if new_depth < victim_depth:
+                return False
+
+        # The check word is built from the values written here, never re-read from the slot:
+        # another writer may have changed the slot in between, which must fail verification
+        value_bits = _WORD.unpack(_DOUBLE.pack(value))[0]
+        words[victim + 1] = value_bits
+        words[victim + 2] = new_node
+        words[victim] = key ^ value_bits ^ new_node
+        self.stores += 1
+        return True
+
+    def clear(self):
+        """Empty every slot (other processes see the change immediately)"""
+        start = 8 * _HEADER_WORDS
+        self._shm.buf[start:] = bytes(len(self._shm.buf) - start)
+
+    def stats(self):
+        """Return this process' probe/hit/store counters"""
+        hit_rate = self.hits / self.probes if self.probes else 0.0
+        return {"probes": self.probes, "hits": self.hits, "stores": self.stores, "hit_rate": hit_rate}
+
+    def _release_views(self):
+        if self._words is not None:
+            self._words.release()
+            self._words = None
+
+    def close(self):
+        """Detach this process from the table"""
+        self._release_views()
+        self._shm.close()
+
+    def unlink(self):
+        """Destroy the shared memory block (only the creator should call this)"""
+        self._shm.unlink()
@@ -0,0 +1,33 @@
+"""The agent's evaluation paths must agree with evaluate_grid"""
+import random
+
+import pytest
+
+from agent2048 import board as boards
+from agent2048.agent import HeuristicAgent
+
+
+def random_grids(rng, size, count):
+    grids = []
+    for _ in range(count):
+        density = rng.random()
+        high = rng.choice((3, 11, 17, 40))
+        grids.append([[1 << rng.randint(1, high) if rng.random() < density else 0 for _ in range(size)]
+                      for _ in range(size)])
+    return grids
+
+
+@pytest.mark.parametrize("size", [2, 3, 4, 5, 6])
+def test_search_evaluation_matches_evaluate_grid(size):
+    # The search scores exponent bytes; evaluate_grid stays the definition of the heuristic
+    agent = HeuristicAgent(grid_size=size, verbose=False)
+    for grid in random_grids(random.Random(size), size, 3000):
+        assert agent._evaluate_exponents(boards.encode(grid)) == agent.evaluate_grid(grid), grid
+
+
+@pytest.mark.parametrize("size", [2, 3, 4, 5, 6])
+def test_evaluate_grids_with_numpy_matches_evaluate_grid(size):
+    pytest.importorskip("numpy")
+    agent = HeuristicAgent(grid_size=size, verbose=False)
+    grids = random_grids(random.Random(size), size, 2 * agent.array_batch_size + 1)
+    assert agent.evaluate_grids(grids) == [agent.evaluate_grid(grid) for grid in grids]
@@ -0,0 +1,15 @@
+"""Differential check of every available engine against the reference engine
+
+Longer runs: agent2048 fuzz --positions 1000000 --workers 8
+"""
+import pytest
+
+from agent2048.engine import available_engines
+from agent2048.fuzz import run_fuzz
+
+
+@pytest.mark.parametrize("size", [4, 5, 6])
+def test_engines_match_reference(size):
+    checked = run_fuzz(2000, sizes=(size,), seed=size)
+    engines = [name for name in available_engines(size) if name != "reference"]
+    assert checked == {(size, name): 2000 for name in engines}
@@ -0,0 +1,45 @@
+"""Round trip through the evaluation server over a Unix socket"""
+import asyncio
+import json
+import os
+
+from agent2048.agent import HeuristicAgent
+from agent2048.serve import EvaluationServer
+
+GRID = [[2, 0, 0, 0], [0, 4, 0, 0], [0, 0, 0, 0], [0, 0, 8, 2]]
+
+
+async def _exchange(path, messages):
+    server = EvaluationServer(HeuristicAgent(verbose=False, search_depth=2), batch_window_ms=50)
+    serving = asyncio.create_task(server.serve(unix_path=path))
+    try:
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+        for message in messages:
+            writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in messages]
+        writer.close()
+        return {response["id"]: response for response in responses}
+    finally:
+        serving.cancel()
+        await asyncio.gather(serving, return_exceptions=True)
+
+
+def test_server_round_trip(tmp_path):
+    agent = HeuristicAgent(verbose=False)
+    messages = [{"id": i, "op": "evaluate_grid", "grid": GRID} for i in range(3)]
+    messages.append({"id": "other", "op": "evaluate_grid", "grid": [row[::-1] for row in GRID]})
+    messages.append({"id": "invalid", "op": "evaluate_grid", "grid": [[3, 0], [0, 0]]})
+    messages.append({"id": "expired", "op": "make_decision", "grid": GRID, "deadline_ms": 0.001})
+    messages.append({"id": "move", "op": "make_decision", "grid": GRID})
+
+    responses = asyncio.run(_exchange(str(tmp_path / "agent.sock"), messages))
+
+    for i in range(3):
+        assert responses[i] == {"id": i, "result": agent.evaluate_grid(GRID)}
+    assert responses["other"]["result"] == agent.evaluate_grid([row[::-1] for row in GRID])
+    assert "error" in responses["invalid"]
+    assert responses["expired"] == {"id": "expired", "error": "deadline exceeded"}
+    assert responses["move"]["result"] in ("up", "down", "left", "right")
@@ -0,0 +1,47 @@
+"""Semantics of the shared transposition table"""
+import multiprocessing
+
+from agent2048.ttable import SharedTranspositionTable, board_key
+
+
+def test_keys_of_different_board_sizes_differ():
+    three = bytes([1] + [0] * 8)
+    four = bytes([0] * 7 + [1] + [0] * 8)
+    assert board_key(three) != board_key(four)
+
+
+def test_replaces_only_with_deeper_searches():
+    with SharedTranspositionTable.create(num_buckets=16) as table:
+        assert table.store(42, 2, 1.0)
+        assert not table.store(42, 1, 5.0)  # Shallower: kept the old entry
+        assert not table.store(42, 2, 5.0)  # Same depth: kept the old entry
+        assert table.probe(42, 2) == 1.0
+        assert table.probe(42, 3) is None  # Not searched deep enough
+
+        assert table.store(42, 3, 7.0)
+        assert table.probe(42, 3) == 7.0
+        assert table.probe(42, 1) == 7.0
+
+
+def test_max_and_chance_nodes_are_separate():
+    with SharedTranspositionTable.create(num_buckets=16) as table:
+        table.store(42, 2, 1.0, player_turn=True)
+        assert table.probe(42, 2, player_turn=False) is None
+        table.store(42, 2, 2.0, player_turn=False)
+        assert table.probe(42, 2, player_turn=True) == 1.0
+        assert table.probe(42, 2, player_turn=False) == 2.0
+
+
+def _store_in_child(table):
+    table.store(7, 4, 123.5)
+    table.close()
+
+
+def test_other_processes_attach_by_name():
+    with SharedTranspositionTable.create(num_buckets=16) as table:
+        # A spawned child gets the table pickled and re-attaches through __reduce__
+        child = multiprocessing.get_context("spawn").Process(target=_store_in_child, args=(table,))
+        child.start()
+        child.join()
+        assert child.exitcode == 0
+        assert table.probe(7, 4) == 123.5